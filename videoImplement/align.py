@@ -8,17 +8,18 @@ import pandas as pd
 import numpy as np
 
 import scripts.others.util as util
-import scripts.others.graph as graph
 
-# load the dataframe
-util.dprint("Loading processed data for PLR metrics calculation")
 df1Path = "../videoImplement/data/PLR_Tuna_R_1920x1080_30_4/"
-df = pd.read_csv(df1Path + 'processed.csv')
 
 vidFps = 30
+# "mean" (original) or "median": a median baseline ignores a few leftover spikes/blink edges before the TPLR start
+baselineStatistic = "mean"
+
+# np.trapz was renamed to np.trapezoid in numpy 2
+trapezoid = getattr(np, 'trapezoid', None) or np.trapz
 
 # find the first constriction
-def lowestDip(startingIndex=0, fps=vidFps):
+def lowestDip(df, startingIndex=0, fps=vidFps):
     diameterMM = df['diameter_mm'].values
     timestamp = df['timestamp'].values
 
@@ -36,7 +37,7 @@ def lowestDip(startingIndex=0, fps=vidFps):
     return minIndex
 
 # approximate baseline to be 1.5s before the constriction
-def findBaseline(dipIndex, fps=vidFps):
+def findBaseline(df, dipIndex, fps=vidFps):
     diameterMM = df['diameter_mm'].values
     timestamp = df['timestamp'].values
 
@@ -48,7 +49,7 @@ def findBaseline(dipIndex, fps=vidFps):
 
 
 # find start of transient PLR as the first point where the difference between this point and the next point exceeds a threshold
-def findTPLRStart(baselineIndex, dipIndex, startIndexBuffer=1, fps=vidFps, changeThresh=0.2):
+def findTPLRStart(df, baselineIndex, dipIndex, startIndexBuffer=1, fps=vidFps, changeThresh=0.2):
     diameterMM = df['diameter_mm'].values
     timestamp = df['timestamp'].values
 
@@ -72,7 +73,7 @@ def findDifference(onsetIndex, dipIndex, fps=vidFps):
     return timeDiffSeconds
 
 # find a new baseline to be 1.5s before the tplr start
-def findNewBaselineIndex(tplrStartIndex, fps=vidFps, offsetThreshold=2):
+def findNewBaselineIndex(df, tplrStartIndex, fps=vidFps, offsetThreshold=2):
     diameterMM = df['diameter_mm'].values
     timestamp = df['timestamp'].values
 
@@ -83,7 +84,7 @@ def findNewBaselineIndex(tplrStartIndex, fps=vidFps, offsetThreshold=2):
     return onsetIndex
 
 # find baseline diameter to be average of all points in the 1.5s before tplr start
-def findNewBaselineAvgDiameter(tplrStartIndex, fps=vidFps):
+def findNewBaselineAvgDiameter(df, tplrStartIndex, fps=vidFps, statistic="mean"):
     diameterMM = df['diameter_mm'].values
 
     onsetOffsetFrames = int(1.5 * fps)
@@ -98,12 +99,15 @@ def findNewBaselineAvgDiameter(tplrStartIndex, fps=vidFps):
         util.dprint("No valid baseline values found.")
         return None
 
-    baselineDiameter = sum(baselineValues) / len(baselineValues)
+    if statistic == "median":
+        baselineDiameter = float(np.median(baselineValues))
+    else:
+        baselineDiameter = sum(baselineValues) / len(baselineValues)
     util.dprint(f"New Baseline diameter calculated as {baselineDiameter} mm from index {startIndex} to {tplrStartIndex - 1}")
     return baselineDiameter
 
 # find the point where the pupil has fully recovered to be 6.7s after the dip
-def findRecovery(baselineIndex, dipIndex, fps=vidFps, recoveryOffset=6.7):
+def findRecovery(df, baselineIndex, dipIndex, fps=vidFps, recoveryOffset=6.7):
     diameterMM = df['diameter_mm'].values
     timestamp = df['timestamp'].values
 
@@ -115,7 +119,7 @@ def findRecovery(baselineIndex, dipIndex, fps=vidFps, recoveryOffset=6.7):
 
 
 # find end point as 35s after dip 
-def findEndPoint(dipIndex, fps=vidFps, endOffset=35.0):
+def findEndPoint(df, dipIndex, fps=vidFps, endOffset=35.0):
     diameterMM = df['diameter_mm'].values
     timestamp = df['timestamp'].values
 
@@ -127,7 +131,7 @@ def findEndPoint(dipIndex, fps=vidFps, endOffset=35.0):
 
 # collect points from baseline to recovery to a new dataframe 
 # also reset its timestamps from 0
-def collectPLRSegment(baselineIndex, endPoint, plrStartIndex, fps=vidFps, ):
+def collectPLRSegment(df, baselineIndex, endPoint, plrStartIndex, fps=vidFps, ):
     diameterMM = df['diameter_mm'].values
     diameterPixels = df['diameter'].values
     timestamp = df['timestamp'].values
@@ -149,17 +153,17 @@ def collectPLRSegment(baselineIndex, endPoint, plrStartIndex, fps=vidFps, ):
     print(plrDF.head())
     return plrDF
 
-def findPoints(startingIndex):
-    dipIndex = lowestDip(startingIndex)
-    baselineIndex = findBaseline(dipIndex)
-    TPLRStartIndex = findTPLRStart(baselineIndex, dipIndex, startIndexBuffer=7)
-    timeDiff = findDifference(TPLRStartIndex, dipIndex)
-
-    baselineIndex = findNewBaselineIndex(TPLRStartIndex)
-    recoveryIndex = findRecovery(baselineIndex, dipIndex)
-    endPoint = findEndPoint(dipIndex)
-    plrDF = collectPLRSegment(baselineIndex, endPoint, TPLRStartIndex)
-    baselineDiameter = findNewBaselineAvgDiameter(TPLRStartIndex)
+def findPoints(df, startingIndex, fps=vidFps):
+    dipIndex = lowestDip(df, startingIndex, fps=fps)
+    baselineIndex = findBaseline(df, dipIndex, fps=fps)
+    TPLRStartIndex = findTPLRStart(df, baselineIndex, dipIndex, startIndexBuffer=7, fps=fps)
+    timeDiff = findDifference(TPLRStartIndex, dipIndex, fps=fps)
+
+    baselineIndex = findNewBaselineIndex(df, TPLRStartIndex, fps=fps)
+    recoveryIndex = findRecovery(df, baselineIndex, dipIndex, fps=fps)
+    endPoint = findEndPoint(df, dipIndex, fps=fps)
+    plrDF = collectPLRSegment(df, baselineIndex, endPoint, TPLRStartIndex, fps=fps)
+    baselineDiameter = findNewBaselineAvgDiameter(df, TPLRStartIndex, fps=fps, statistic=baselineStatistic)
     return baselineDiameter, TPLRStartIndex, dipIndex, baselineIndex, plrDF
 
 # find and display these metrics:
@@ -183,7 +187,9 @@ def calculateMetrics(baselineDiameter, TPLRStartIndex, dipIndex, baselineIndex,
     
     # Calculate area under curve between 10s and 30s
     # Normalize pupil diameter as percentage from baseline (100% = baseline)
-    mask_10_30 = (timestamp >= 10.0) & (timestamp <= 30.0)
+    # NaN samples (gaps longer than sixthPass leaves filled) are left out, so the trapezoid bridges each gap
+    # with a straight line between its valid neighbours instead of making the whole AUC NaN (same as liveMetrics)
+    mask_10_30 = (timestamp >= 10.0) & (timestamp <= 30.0) & ~np.isnan(diameterMM)
     timestamps_10_30 = timestamp[mask_10_30]
     diameters_10_30 = diameterMM[mask_10_30]
     
@@ -192,7 +198,7 @@ def calculateMetrics(baselineDiameter, TPLRStartIndex, dipIndex, baselineIndex,
         normalized_diameters = (diameters_10_30 / baselineDiameter) * 100.0
         
         # Calculate AUC using trapezoidal rule
-        auc_10_30 = np.trapz(normalized_diameters, timestamps_10_30)
+        auc_10_30 = trapezoid(normalized_diameters, timestamps_10_30)
         util.dprint(f"Area Under Curve (10s-30s, normalized): {auc_10_30} %·s")
     else:
         auc_10_30 = 0
@@ -218,26 +224,34 @@ def calculateMetrics(baselineDiameter, TPLRStartIndex, dipIndex, baselineIndex,
     }
 
 
-# start blue light stimuli at index 0
-print(" ")
-print("--------------------- BLUE LIGHT METRICS CALCULATION -----------------")
-util.dprint("Calculating PLR metrics for blue light stimuli")
-blueBaselineDiameter, blueTPLRStartIndex, blueDipIndex, blueBaselineIndex, bluePLRDF = findPoints(0)
-blueMetrics = calculateMetrics(blueBaselineDiameter, blueTPLRStartIndex, blueDipIndex, blueBaselineIndex, bluePLRDF)
-graph.plotResults(bluePLRDF, savePath=df1Path + "plrSegmentPlotBlue.png", showPlot=True, showMm=True, showConfidence=False, title="PLR Segment - Blue Light Stimuli")
-util.dprint(f"Blue Light Stimuli: Baseline Diameter = {blueBaselineDiameter} mm, TPLR Start Index = {blueTPLRStartIndex}, Dip Index = {blueDipIndex}")
-
-# start red light stimuli at approx 55s? (after blue stimuli ends + rest period)
-print(" ")
-print("--------------------- RED LIGHT METRICS CALCULATION -----------------")
-util.dprint("Calculating PLR metrics for red light stimuli")
-redStimuliStartIndex = int(55 * vidFps)
-redBaselineDiameter, redTPLRStartIndex, redDipIndex, redBaselineIndex, redPLRDF = findPoints(redStimuliStartIndex)
-redMetrics = calculateMetrics(redBaselineDiameter, redTPLRStartIndex, redDipIndex, redBaselineIndex, redPLRDF)
-graph.plotResults(redPLRDF, savePath=df1Path + "plrSegmentPlotRed.png", showPlot=True, showMm=True, showConfidence=False, title="PLR Segment - Red Light Stimuli")
-util.dprint(f"Red Light Stimuli: Baseline Diameter = {redBaselineDiameter} mm, TPLR Start Index = {redTPLRStartIndex}, Dip Index = {redDipIndex}")
-
-# calculate net pipr as the difference between blue auc and red auc
-print(" ")
-netPIPR = blueMetrics['auc_10_30s_percent_seconds'] - redMetrics['auc_10_30s_percent_seconds']
-util.dprint(f"Net PIPR (Blue AUC - Red AUC): {netPIPR} %·s")
\ No newline at end of file
+if __name__ == "__main__":
+    # only the script part plots, dont make every importer load matplotlib
+    import scripts.others.graph as graph
+
+    # load the dataframe
+    util.dprint("Loading processed data for PLR metrics calculation")
+    df = pd.read_csv(df1Path + 'processed.csv')
+
+    # start blue light stimuli at index 0
+    print(" ")
+    print("--------------------- BLUE LIGHT METRICS CALCULATION -----------------")
+    util.dprint("Calculating PLR metrics for blue light stimuli")
+    blueBaselineDiameter, blueTPLRStartIndex, blueDipIndex, blueBaselineIndex, bluePLRDF = findPoints(df, 0)
+    blueMetrics = calculateMetrics(blueBaselineDiameter, blueTPLRStartIndex, blueDipIndex, blueBaselineIndex, bluePLRDF)
+    graph.plotResults(bluePLRDF, savePath=df1Path + "plrSegmentPlotBlue.png", showPlot=True, showMm=True, showConfidence=False, title="PLR Segment - Blue Light Stimuli")
+    util.dprint(f"Blue Light Stimuli: Baseline Diameter = {blueBaselineDiameter} mm, TPLR Start Index = {blueTPLRStartIndex}, Dip Index = {blueDipIndex}")
+
+    # start red light stimuli at approx 55s? (after blue stimuli ends + rest period)
+    print(" ")
+    print("--------------------- RED LIGHT METRICS CALCULATION -----------------")
+    util.dprint("Calculating PLR metrics for red light stimuli")
+    redStimuliStartIndex = int(55 * vidFps)
+    redBaselineDiameter, redTPLRStartIndex, redDipIndex, redBaselineIndex, redPLRDF = findPoints(df, redStimuliStartIndex)
+    redMetrics = calculateMetrics(redBaselineDiameter, redTPLRStartIndex, redDipIndex, redBaselineIndex, redPLRDF)
+    graph.plotResults(redPLRDF, savePath=df1Path + "plrSegmentPlotRed.png", showPlot=True, showMm=True, showConfidence=False, title="PLR Segment - Red Light Stimuli")
+    util.dprint(f"Red Light Stimuli: Baseline Diameter = {redBaselineDiameter} mm, TPLR Start Index = {redTPLRStartIndex}, Dip Index = {redDipIndex}")
+
+    # calculate net pipr as the difference between blue auc and red auc
+    print(" ")
+    netPIPR = blueMetrics['auc_10_30s_percent_seconds'] - redMetrics['auc_10_30s_percent_seconds']
+    util.dprint(f"Net PIPR (Blue AUC - Red AUC): {netPIPR} %·s")
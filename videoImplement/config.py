@@ -0,0 +1,9 @@
+# settings shared by detection, preprocessing and metrics
+# keep this file free of imports: csv-only scripts and worker processes import it instead of main,
+# so they dont have to load cv2/matplotlib/pypupilext just to read two numbers
+
+confidenceThresh = 0.75
+pxToMm = 30 # for 1080p
+
+# written by scripts/detection/detectorBenchmark.py, read when main.detectorAlgorithm = "auto"
+detectorRecommendationPath = "data/detectorRecommendation.json"
@@ -1,4 +1,5 @@
-from main import dprint, plotResults
+from scripts.others.util import dprint
+from scripts.others.graph import plotResults
 import pandas as pd
 
 csvPath = "./data/PLR_Tuna_R_1280x720_60_2/processed.csv"
@@ -0,0 +1,248 @@
+# local processing service so the acquisition station doesnt pay for interpreter start + cv2/pypupilext
+# imports + detector setup on every short recording
+# a pool of long-lived worker processes imports main once and warms the detector, jobs are queued onto it
+# localhost only, plain HTTP + JSON:
+#   POST   /jobs                      {"video": "path/to/video.mp4", "options": {"useCascade": true, ...}} -> {"id": ...}
+#   GET    /jobs                      every job with its status
+#   GET    /jobs/<id>                 status: queued / running / done / failed / cancelled, progress, quality
+#   GET    /jobs/<id>/raw.csv         detection output
+#   GET    /jobs/<id>/processed.csv   after process.doProcessing
+#   DELETE /jobs/<id>                 cancel (stops detection at the next frame)
+# run from videoImplement/:
+#   python jobServer.py [port] [workers]
+import os
+import sys
+import json
+import time
+import itertools
+import threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from scripts.others.util import dprint
+
+host = "127.0.0.1"
+port = 8765
+# main globals a job may change, everything else stays as main.py has it
+jobOptions = ["useCascade", "cascadeScale", "mmPrecision", "useAdaptiveSampling", "restFps", "useKalmanTracker",
+              "useQualityGate", "useStaticSkip", "staticDiffThresh", "maxCarryOver", "detectorAlgorithm",
+              "resumeDetection", "useBlinkGate"]
+# how often (frames) a worker reports progress back
+progressEvery = 30
+
+
+# ---- worker process side ----
+
+_defaults = {}
+
+
+def _initWorker():
+    # everything a job needs is imported here, once per worker
+    import numpy as np
+    import main
+    import process
+    import scripts.detection.ppDetect as ppDetect
+    # the server has no screen, and jobs running at the same time must not share the frames/ folder
+    main.showDetections = False
+    main.useGrayDecode = True
+    for name in jobOptions:
+        _defaults[name] = getattr(main, name)
+    # first detector construction + run loads the pypupilext models, do it before the first job arrives
+    # main.pupilDetection picks the same per-process detector up again (ppDetect.processDetector)
+    algorithm = main.detectorAlgorithm if main.detectorAlgorithm != "auto" else "PuReST"
+    ppDetect.processDetector(algorithm).runWithConfidence(np.zeros((480, 640), dtype=np.uint8))
+    dprint(f"Worker {os.getpid()} ready")
+
+
+def _runJob(jobId, videoPath, options, jobs, cancelRequests):
+    import main
+    import process
+    for name, value in _defaults.items():
+        setattr(main, name, options.get(name, value))
+
+    def update(**fields):
+        # manager dict entries only update when the whole value is assigned again
+        # only the worker writes a job's entry once it is queued, cancels go to cancelRequests
+        job = jobs[jobId]
+        job.update(fields)
+        jobs[jobId] = job
+
+    def onProgress(done, total, diameter, confidence):
+        if done % progressEvery == 0:
+            update(frames_done=done, frames_total=total or 0)
+            return jobId not in cancelRequests
+
+    if jobId in cancelRequests:
+        return
+    update(status='running', started=time.time())
+    try:
+        df, quality, folder, frameRate = main.detectSession(videoPath, onProgress)
+        update(frames_done=len(df), quality=quality, folder=folder, raw_csv=os.path.join(folder, "raw.csv"))
+        if quality['status'] == 'cancelled':
+            update(status='cancelled', finished=time.time())
+            return
+        if quality['status'] == 'ok':
+            processed = process.doProcessing(df.copy(), fps=frameRate)
+            processedPath = os.path.join(folder, "processed.csv")
+            processed.to_csv(processedPath, index=False)
+            update(processed_csv=processedPath)
+        update(status='done', finished=time.time())
+    except Exception as e:
+        update(status='failed', error=f"{type(e).__name__}: {e}", finished=time.time())
+
+
+# ---- server side ----
+
+def sessionName(videoPath):
+    # same name main.detectSession uses for data/<name>/ and the checkpoint
+    return os.path.basename(videoPath).split('.')[0]
+
+
+class JobServer:
+    def __init__(self, workers=None):
+        self.manager = mp.Manager()
+        self.jobs = self.manager.dict()
+        # kept apart from self.jobs so a worker's progress update cant overwrite a cancel
+        self.cancelRequests = self.manager.dict()
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.closed = False
+        self.workers = workers or os.cpu_count()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_initWorker)
+
+    def submit(self, videoPath, options=None):
+        options = options or {}
+        unknown = [name for name in options if name not in jobOptions]
+        if unknown:
+            raise ValueError(f"unknown options {unknown}, allowed: {jobOptions}")
+        if not os.path.exists(videoPath):
+            raise ValueError(f"video '{videoPath}' does not exist")
+        with self.lock:
+            # outputs go to data/<session>/ and checkpoints/<session>.bin, two live jobs with the same
+            # video file name (even from different folders) would write over each other
+            session = sessionName(videoPath)
+            for job in self.status():
+                if job['status'] in ('queued', 'running') and job['session'] == session:
+                    raise ValueError(f"job {job['id']} ('{job['video']}') is still {job['status']} and writes to the same "
+                                     f"session '{session}', wait for it or cancel it first")
+            jobId = str(next(self.ids))
+            self.jobs[jobId] = {'id': jobId, 'video': videoPath, 'session': session, 'options': options, 'status': 'queued',
+                                'submitted': time.time(), 'frames_done': 0, 'frames_total': 0}
+        future = self.pool.submit(_runJob, jobId, videoPath, options, self.jobs, self.cancelRequests)
+        future.add_done_callback(lambda f: self._crashed(jobId, f))
+        dprint(f"Job {jobId} queued: '{videoPath}' {options}")
+        return jobId
+
+    def _crashed(self, jobId, future):
+        # _runJob catches pipeline errors itself, this is for a worker process dying
+        # futures cancelled by shutdown have no exception to ask for, and after shutdown the manager
+        # holding self.jobs is gone (jobs still running then fail on it, that is not a crash)
+        if future.cancelled() or self.closed:
+            return
+        if future.exception() is not None:
+            job = self.jobs[jobId]
+            job.update(status='failed', error=str(future.exception()))
+            self.jobs[jobId] = job
+
+    def cancel(self, jobId):
+        # never written into self.jobs: the worker may be updating that entry at the same moment
+        self.cancelRequests[jobId] = True
+        return self.status(jobId)
+
+    def view(self, job):
+        # a queued job that got cancelled never reaches the worker's status updates, report it here
+        job = dict(job)
+        if job['status'] == 'queued' and job['id'] in self.cancelRequests:
+            job['status'] = 'cancelled'
+        return job
+
+    def status(self, jobId=None):
+        if jobId is None:
+            return [self.view(job) for job in self.jobs.values()]
+        return self.view(self.jobs[jobId])
+
+    def shutdown(self):
+        self.closed = True
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.manager.shutdown()
+
+
+def makeHandler(server):
+    class Handler(BaseHTTPRequestHandler):
+        def sendJson(self, code, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def jobPath(self):
+            # /jobs/<id>[/<file>] -> (id or None, file or None, whether it was a /jobs path at all)
+            parts = [p for p in self.path.split("?")[0].split("/") if p]
+            if not parts or parts[0] != "jobs":
+                return None, None, False
+            jobId = parts[1] if len(parts) > 1 else None
+            fileName = parts[2] if len(parts) > 2 else None
+            return jobId, fileName, True
+
+        def do_GET(self):
+            jobId, fileName, ok = self.jobPath()
+            if not ok:
+                return self.sendJson(404, {'error': 'not found'})
+            if jobId is None:
+                return self.sendJson(200, server.status())
+            if jobId not in server.jobs:
+                return self.sendJson(404, {'error': f"no job {jobId}"})
+            job = server.status(jobId)
+            if fileName is None:
+                return self.sendJson(200, job)
+            key = {'raw.csv': 'raw_csv', 'processed.csv': 'processed_csv'}.get(fileName)
+            if key is None or key not in job or not os.path.exists(job[key]):
+                return self.sendJson(404, {'error': f"{fileName} not available, job is {job['status']}"})
+            with open(job[key], "rb") as f:
+                body = f.read()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/csv")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            jobId, fileName, ok = self.jobPath()
+            if not ok or jobId is not None:
+                return self.sendJson(404, {'error': 'not found'})
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                jobId = server.submit(request['video'], request.get('options'))
+            except (ValueError, KeyError) as e:
+                return self.sendJson(400, {'error': str(e)})
+            self.sendJson(202, {'id': jobId})
+
+        def do_DELETE(self):
+            jobId, fileName, ok = self.jobPath()
+            if not ok or jobId not in server.jobs:
+                return self.sendJson(404, {'error': 'not found'})
+            self.sendJson(200, server.cancel(jobId))
+
+        def log_message(self, format, *args):
+            dprint(f"{self.address_string()} {format % args}")
+
+    return Handler
+
+
+def serve(port=port, workers=None):
+    server = JobServer(workers)
+    httpd = ThreadingHTTPServer((host, port), makeHandler(server))
+    dprint(f"Job server listening on http://{host}:{port} with {server.workers} workers")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    serve(int(sys.argv[1]) if len(sys.argv) > 1 else port, int(sys.argv[2]) if len(sys.argv) > 2 else None)
@@ -0,0 +1,223 @@
+# incremental PLR metrics: same numbers as align.findPoints + align.calculateMetrics, but fed one sample
+# (or one chunk) at a time so a live session shows the blue light results as soon as their window closes
+# instead of after the whole recording has been processed
+# per stimulus the running state is:
+#   - running minimum over the 5s dip search window -> dip closes 5s after the stimulus start
+#   - a short sample buffer reaching back far enough for the TPLR start and the 1.5s baseline average
+#   - a trapezoid accumulator for the 10-30s AUC -> closes 30s after the TPLR start
+#     the live trace is not interpolated yet (NaN on every low confidence frame), NaN samples are skipped so the
+#     trapezoid bridges each gap with a straight line between its valid neighbours
+import math
+from collections import deque
+import numpy as np
+import scripts.others.util as util
+
+
+class StimulusMetrics:
+    # one stimulus (blue or red), parameters match align.py
+    def __init__(self, fps, startingIndex=0, label="blue", searchSeconds=5.0, baselineSeconds=1.5,
+                 startIndexBuffer=7, changeThresh=0.2, aucWindow=(10.0, 30.0)):
+        self.fps = fps
+        self.label = label
+        self.start = startingIndex
+        self.searchEnd = startingIndex + int(searchSeconds * fps)  # exclusive, like lowestDip
+        self.baselineFrames = int(baselineSeconds * fps)
+        self.startIndexBuffer = startIndexBuffer
+        self.changeThresh = changeThresh
+        self.aucStart, self.aucEnd = aucWindow
+
+        # the TPLR start is at least dip - 1.5s, its baseline average another 1.5s before that
+        self.lookback = 2 * self.baselineFrames
+        self.buffer = deque()  # (index, timestamp, diameter_mm)
+
+        self.minDiameter = float('inf')
+        self.dipIndex = -1
+        self.dipClosed = False
+        self.tplrStartIndex = -1
+        self.tplrTime = None
+        self.baselineDiameter = None
+
+        self.aucSum = 0.0  # trapezoid of the raw mm trace, normalised once at the end (its linear)
+        self.aucPrev = None
+        self.aucClosed = False
+        self.metrics = {}
+
+    def push(self, index, timestamp, diameterMm):
+        # returns the metrics that became final with this sample (empty dict most of the time)
+        emitted = {}
+        if index < self.start - self.lookback:
+            return emitted
+
+        if not self.dipClosed:
+            self.buffer.append((index, timestamp, diameterMm))
+            if self.start <= index < self.searchEnd and not math.isnan(diameterMm) and diameterMm < self.minDiameter:
+                self.minDiameter = diameterMm
+                self.dipIndex = index
+            if index >= self.searchEnd - 1:
+                emitted.update(self.closeDip())
+            return emitted
+
+        if not self.aucClosed and self.tplrTime is not None:
+            emitted.update(self.addAuc(timestamp, diameterMm))
+        return emitted
+
+    def sample(self, index):
+        return self.buffer[index - self.buffer[0][0]]
+
+    def closeDip(self):
+        self.dipClosed = True
+        if self.dipIndex < 0:
+            util.dprint(f"{self.label}: no valid sample in the dip search window")
+            self.aucClosed = True
+            return {}
+        baselineIndex = max(0, self.dipIndex - self.baselineFrames)
+        for i in range(max(baselineIndex, self.buffer[0][0]), self.dipIndex):
+            d0, d1 = self.sample(i)[2], self.sample(i + 1)[2]
+            if not math.isnan(d0) and not math.isnan(d1) and abs(d1 - d0) > self.changeThresh:
+                self.tplrStartIndex = max(baselineIndex, i - self.startIndexBuffer)
+                break
+        if self.tplrStartIndex < 0:
+            util.dprint(f"{self.label}: PLR start not found within the specified range.")
+            self.aucClosed = True
+            return {}
+
+        self.tplrTime = self.sample(self.tplrStartIndex)[1]
+        baselineValues = [d for i, t, d in self.buffer if max(0, self.tplrStartIndex - self.baselineFrames) <= i < self.tplrStartIndex and not math.isnan(d)]
+        if len(baselineValues) == 0:
+            util.dprint(f"{self.label}: no valid baseline values found.")
+            self.aucClosed = True
+            return {}
+        self.baselineDiameter = sum(baselineValues) / len(baselineValues)
+
+        baseline = self.baselineDiameter
+        dip = self.minDiameter
+        timeToDip = self.sample(self.dipIndex)[1] - self.tplrTime
+        emitted = {
+            'baseline_diameter_mm': baseline,
+            'transient_plr_percent': (baseline - dip) / baseline * 100.0,
+            'constriction_velocity_mm_per_s': (baseline - dip) / timeToDip if timeToDip > 0 else 0,
+            'peak_constriction_diameter_mm': dip,
+            'peak_constriction_percent': (baseline - dip) / baseline * 100.0,
+        }
+        self.metrics.update(emitted)
+        util.dprint(f"{self.label}: dip at index {self.dipIndex} ({dip} mm), TPLR start at index {self.tplrStartIndex}, baseline {baseline} mm")
+
+        # samples that arrived before the dip window closed may already be inside the AUC window
+        for index, timestamp, diameterMm in list(self.buffer):
+            if index >= self.tplrStartIndex and not self.aucClosed:
+                emitted.update(self.addAuc(timestamp, diameterMm))
+        # from here on only the AUC accumulator is needed
+        self.buffer.clear()
+        return emitted
+
+    def addAuc(self, timestamp, diameterMm):
+        t = timestamp - self.tplrTime
+        if t > self.aucEnd:
+            return self.closeAuc()
+        if t >= self.aucStart and not math.isnan(diameterMm):
+            if self.aucPrev is not None:
+                prevT, prevD = self.aucPrev
+                self.aucSum += 0.5 * (diameterMm + prevD) * (t - prevT)
+            self.aucPrev = (t, diameterMm)
+        return {}
+
+    def closeAuc(self):
+        self.aucClosed = True
+        if self.baselineDiameter is None:
+            return {}
+        # no sample in the window gives 0, same as calculateMetrics
+        auc = self.aucSum / self.baselineDiameter * 100.0 if self.aucPrev is not None else 0
+        self.metrics['auc_10_30s_percent_seconds'] = auc
+        util.dprint(f"{self.label}: Area Under Curve (10s-30s, normalized): {auc} %·s")
+        return {'auc_10_30s_percent_seconds': auc}
+
+    def finish(self):
+        # end of the recording: close whatever is still open with the data we have
+        emitted = {}
+        if not self.dipClosed and self.buffer:
+            emitted.update(self.closeDip())
+        if not self.aucClosed:
+            emitted.update(self.closeAuc())
+        return emitted
+
+
+class LivePLRMetrics:
+    # blue at the start of the recording, red at ~55s like align.py's script part
+    # onMetric(stimulus, name, value) is called as soon as a metric is final
+    def __init__(self, fps, stimulusStarts=None, onMetric=None):
+        if stimulusStarts is None:
+            stimulusStarts = {'blue': 0, 'red': int(55 * fps)}
+        self.stimuli = {label: StimulusMetrics(fps, start, label) for label, start in stimulusStarts.items()}
+        self.onMetric = onMetric
+        self.fps = fps
+        self.index = 0
+        self.netPIPR = None
+
+    # index is the sample's frame index, None = the frame after the last push
+    # frames jumped over (restored from a checkpoint, never reported) go in as NaN so the stimuli see every index
+    def push(self, timestamp, diameterMm, index=None):
+        if index is None:
+            index = self.index
+        if index < self.index:
+            raise ValueError(f"frame {index} pushed after frame {self.index - 1}, frames must come in order")
+        while self.index < index:
+            self.pushIndex(self.index / self.fps, float('nan'))
+        self.pushIndex(timestamp, diameterMm)
+
+    def pushIndex(self, timestamp, diameterMm):
+        diameterMm = float(diameterMm)
+        for label, stimulus in self.stimuli.items():
+            self.emit(label, stimulus.push(self.index, timestamp, diameterMm))
+        self.index += 1
+
+    def pushChunk(self, timestamps, diameters):
+        for timestamp, diameterMm in zip(np.asarray(timestamps, dtype=float), np.asarray(diameters, dtype=float)):
+            self.push(timestamp, diameterMm)
+
+    def finish(self):
+        for label, stimulus in self.stimuli.items():
+            self.emit(label, stimulus.finish())
+        return self.metrics
+
+    def emit(self, label, emitted):
+        for name, value in emitted.items():
+            if self.onMetric is not None:
+                self.onMetric(label, name, value)
+        if 'auc_10_30s_percent_seconds' in emitted and self.netPIPR is None:
+            blue = self.stimuli.get('blue')
+            red = self.stimuli.get('red')
+            if blue is not None and red is not None and blue.aucClosed and red.aucClosed \
+                    and 'auc_10_30s_percent_seconds' in blue.metrics and 'auc_10_30s_percent_seconds' in red.metrics:
+                self.netPIPR = blue.metrics['auc_10_30s_percent_seconds'] - red.metrics['auc_10_30s_percent_seconds']
+                if self.onMetric is not None:
+                    self.onMetric('net', 'pipr_percent_seconds', self.netPIPR)
+
+    @property
+    def metrics(self):
+        return {label: dict(stimulus.metrics) for label, stimulus in self.stimuli.items()}
+
+
+if __name__ == "__main__":
+    # python liveMetrics.py <session folder> [fps]
+    # feeds a session's raw.csv the way userGUI does (NaN below the confidence threshold) and checks that every
+    # metric still comes out as a number
+    import sys
+    import pandas as pd
+    from config import confidenceThresh, pxToMm
+    df = pd.read_csv(sys.argv[1] + "/raw.csv")
+    fps = float(sys.argv[2]) if len(sys.argv) > 2 else round(1.0 / np.median(np.diff(df['timestamp'].values)))
+    valid = (df['confidence'] >= confidenceThresh) & (df['diameter'] > 0)
+    diameters = np.where(valid, df['diameter'] / pxToMm, np.nan)
+    util.dprint(f"{(~valid).sum()} of {len(df)} samples are NaN")
+    live = LivePLRMetrics(fps)
+    live.pushChunk(df['timestamp'].values, diameters)
+    results = live.finish()
+    for label, values in results.items():
+        for name, value in values.items():
+            print(f"{label} {name}: {value}")
+    print(f"net pipr_percent_seconds: {live.netPIPR}")
+    bad = [f"{label} {name}" for label, values in results.items() for name, value in values.items() if math.isnan(value)]
+    if live.netPIPR is not None and math.isnan(live.netPIPR):
+        bad.append("net pipr_percent_seconds")
+    if bad:
+        raise SystemExit(f"NaN metrics: {bad}")
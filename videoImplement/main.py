@@ -9,14 +9,22 @@
 import os
 import cv2
 import shutil
-import datetime
 import scripts.others.splitVideo as splitVideo
+import scripts.others.frameSource as frameSource
+import scripts.others.frameArchive as frameArchive
 import scripts.detection.ppDetect as ppDetect
-import scripts.others.graph as graph
+import scripts.detection.cascadeDetect as cascadeDetect
+import scripts.detection.adaptiveSampling as adaptiveSampling
+import scripts.detection.kalmanTracker as kalmanTracker
+import scripts.detection.qualityMonitor as qualityMonitor
+import scripts.detection.frameRing as frameRing
+import scripts.detection.geometryLog as geometryLog
+import scripts.detection.chunkDetect as chunkDetect
+import scripts.detection.staticSkip as staticSkip
+import scripts.detection.blinkGate as blinkGate
+import scripts.detection.detectionCheckpoint as detectionCheckpoint
 import scripts.others.util as util
-import matplotlib.pyplot as plt
 import pandas as pd
-from scipy.interpolate import CubicSpline
 
 #from scripts.preProcessing.firstPass import preProcessFirstPass
 # make sure later u save the detected images into a folder
@@ -24,10 +32,60 @@ from scipy.interpolate import CubicSpline
 pathToVideo = "../eyeVids/tuna/PLR_Tuna_R_1920x1080_30_3.mp4"
 pathToLeft = "./videos/left_half.mp4"
 pathToRight = "./videos/right_half.mp4"
-confidenceThresh = 0.75
+# shared with the csv-only scripts through config.py, change them there
+from config import confidenceThresh, pxToMm
 
 processingIteration = 0
-pxToMm = 30 # for 1080p
+
+# pypupilext detector class (PuReST, PuRe, ...), "auto" = detectorBenchmark's pick for the video resolution
+detectorAlgorithm = "PuReST"
+
+# coarse-to-fine detection: search a downscaled frame, refine on a full res crop only when needed
+useCascade = False
+cascadeScale = 0.5 # per side, so 1/4 of the pixels
+mmPrecision = 0.1 # refine if one coarse pixel is bigger than this many mm
+
+# adaptive sampling: full frame rate around the flashes, restFps during the long rests
+useAdaptiveSampling = False
+restFps = 10
+
+# reuse the last detection while the eye doesnt move (thumbnail difference under staticDiffThresh grey levels)
+# at most maxCarryOver frames in a row
+useStaticSkip = False
+staticDiffThresh = 4.0
+maxCarryOver = 5
+
+# dark-pixel check before the detector: frames it calls closed-eye (blinks) are not detected, they get
+# confidence 0 and closed_eye=True, which removeSusBio takes as blink marking
+useBlinkGate = False
+
+# decode straight to grayscale (ffmpeg/opencv) instead of writing every frame as a BMP first
+useGrayDecode = False
+# kalman tracker: search a crop around the predicted pupil and reject implausible jumps at detection time
+useKalmanTracker = False
+
+# stop detection as soon as the trial can no longer pass badTrial's bad percentage
+useQualityGate = False
+
+# live cv2 window with the detected ellipse
+showDetections = True
+
+# >0: detect in this many worker processes, frames are handed over through a shared memory ring
+# (plain PuReST per frame, the cascade/adaptive sampling/kalman options are not used in this mode)
+detectionWorkers = 0
+# >0: cut the video into this many frame ranges, each worker decodes (seeks) and detects its own range
+# only for useGrayDecode, same per-frame PuReST as detectionWorkers
+decodeChunks = 0
+# append every frame's result to checkpoints/<video name>.bin (flushed every checkpointEvery frames) so a crash
+# only loses the last batch, resumeDetection continues after the frames already in it (serial detection only)
+# with useGrayDecode the video is seeked past those frames, the BMP path still writes every frame of the video
+# to frames/ first and only skips the detection of the ones the checkpoint has
+useCheckpoint = False
+checkpointEvery = 300
+resumeDetection = False
+# keep a lossless crop around the pupil of every frame in data/<video name>/frames.roi (see frameArchive)
+# for audit and re-detection, together with useGrayDecode no full frame ever goes to disk (serial detection only)
+archiveFrames = False
 
 
 
@@ -94,25 +152,253 @@ def videoToImages(video, folderName):
 
     # 3. turn images ito grayscale (actually i think this is part of the algorithm but meh)
     
-def pupilDetectionInFolder(folderPath):
+def grayFramesInFolder(folderPath, start=0):
+    for i in range(start, len(os.listdir(folderPath))):
+        newPath = os.path.join(folderPath, f"frame{i}.bmp")
+        yield i, cv2.imread(newPath, cv2.IMREAD_GRAYSCALE)
+
+
+def pupilDetectionInFolder(folderPath, frameRate=None, onProgress=None, checkpoint=None, archive=None):
     util.dprint(f"Starting pupil detection in folder '{folderPath}'")
+    start = checkpoint.resumeFrom if checkpoint is not None else 0
+    return pupilDetection(grayFramesInFolder(folderPath, start), frameRate, len(os.listdir(folderPath)), onProgress, checkpoint, archive)
+
+
+# decode straight to grayscale and detect, no BMP frames on disk
+def pupilDetectionInVideo(videoPath, onProgress=None, checkpoint=None, archive=None):
+    util.dprint(f"Starting grayscale pupil detection on video '{videoPath}'")
+    # resuming seeks straight past the frames the checkpoint already has
+    source = frameSource.GrayFrameSource(videoPath, start=checkpoint.resumeFrom if checkpoint is not None else 0)
+    if decodeChunks > 0:
+        conf, diameter, extraColumns, quality, geometry = chunkedPupilDetection(videoPath, source.frameCount)
+        return source.fps, len(conf), conf, diameter, extraColumns, quality, geometry
+    conf, diameter, extraColumns, quality, geometry = pupilDetection(source, source.fps, source.frameCount, onProgress, checkpoint, archive)
+    return source.fps, len(conf), conf, diameter, extraColumns, quality, geometry
+
+
+# frames is an iterable of (frame index, grayscale image)
+# returns conf, diameter, extra per-frame columns, the quality gate summary and the geometry log records
+# onProgress(frames done, total frames, diameter, confidence) is called after every frame, adaptive sampling
+# skipped frames with NaN diameter and confidence, after a resume the first call is for frame resumeFrom + 1
+# (frames done counts the restored frames too, so frames done - 1 is always the frame index)
+# returning False from it cancels detection (quality status 'cancelled', the frames so far are kept)
+# checkpoint (detectionCheckpoint.DetectionCheckpoint): every frame is appended to it, frames it already has
+# are taken from it instead of detected (the kalman/adaptive/static skip state starts fresh after a resume)
+# archive (frameArchive.FrameArchiveWriter): every frame's crop around the pupil is added to it
+def pupilDetection(frames, frameRate=None, totalFrames=None, onProgress=None, checkpoint=None, archive=None):
+    if detectionWorkers > 0:
+        return parallelPupilDetection(frames, totalFrames, onProgress)
     conf = []
     diameter = []
-    for i in range(len(os.listdir(folderPath))):
-        filename = f"frame{i}.bmp"
-        newPath = os.path.join(folderPath, filename)
-        imgWithPupil, outline_confidence, pupil_diameter = ppDetect.detect(newPath)
+    geometry = []
+    # extra per-frame columns, only filled for the features that are switched on
+    extraColumns = {}
+    if useCascade:
+        coarseDetector, fineDetector = cascadeDetect.makeCascadeDetectors()
+
+    detector = None
+
+    def runDetector(img):
+        nonlocal detector
+        if useCascade:
+            pupil, refined = cascadeDetect.cascadeDetect(img, coarseDetector, fineDetector, cascadeScale, confidenceThresh, pxToMm, mmPrecision)
+            return pupil
+        if detector is None:
+            # one detector for the whole video (PuReST tracks the pupil from frame to frame), kept per process
+            algorithm = ppDetect.resolveAlgorithm(detectorAlgorithm, img.shape[1], img.shape[0])
+            detector = ppDetect.processDetector(algorithm)
+            util.dprint(f"Detecting with {algorithm}")
+        return ppDetect.detectFrame(img, detector)
+
+    scheduler = None
+    if useAdaptiveSampling and frameRate:
+        scheduler = adaptiveSampling.AdaptiveScheduler(frameRate, restFps=restFps, confidenceThresh=confidenceThresh)
+        extraColumns['was_skipped'] = []
+    tracker = None
+    if useKalmanTracker and frameRate:
+        tracker = kalmanTracker.PupilTracker(runDetector, frameRate, pxToMm=pxToMm, confidenceThresh=confidenceThresh)
+        extraColumns['kalman_rejected'] = []
+        extraColumns['kalman_residual_mm'] = []
+    staticFilter = None
+    if useStaticSkip:
+        staticFilter = staticSkip.StaticFrameFilter(staticDiffThresh, maxCarryOver, confidenceThresh=confidenceThresh)
+        extraColumns['carried_over'] = []
+    closedEye = None
+    if useBlinkGate:
+        closedEye = blinkGate.ClosedEyeClassifier(confidenceThresh=confidenceThresh)
+        extraColumns['closed_eye'] = []
+    lastPupil = None
+    cancelled = False
+    monitor = None
+    if useQualityGate:
+        monitor = qualityMonitor.QualityMonitor(totalFrames, confidenceThresh=confidenceThresh, pxToMm=pxToMm)
+
+    resumeFrom = 0
+    if checkpoint is not None and checkpoint.resumeFrom > 0:
+        resumeFrom = checkpoint.resumeFrom
+        restored = checkpoint.restored
+        conf = restored['confidence'].astype(float).tolist()
+        diameter = restored['diameter'].astype(float).tolist()
+        geometry = checkpoint.geometry()
+        for colName in extraColumns:
+            extraColumns[colName] = checkpoint.column(colName)
+        # the quality gate sees the restored frames again, skipped frames never went through it
+        for record in restored[restored['was_skipped'] == 0]:
+            if monitor is not None and not monitor.update(float(record['confidence']), float(record['diameter']), bool(record['kalman_rejected'])):
+                frames = []
+                break
+
+    def logFrame(i, img, pupil=None):
+        # archive first: a checkpoint flush syncs the archive too, so it never has frames the archive is missing
+        if archive is not None:
+            archive.add(i, img, pupil)
+        if checkpoint is not None:
+            checkpoint.append(geometry[-1], {colName: values[-1] for colName, values in extraColumns.items()})
+
+    for i, img in frames:
+        if i < resumeFrom:
+            continue
+        if scheduler is not None:
+            scheduler.observeFrame(i, img)
+            if not scheduler.shouldDetect(i):
+                # keep the frame in the timeline, interpolation fills it in later
+                conf.append(float('nan'))
+                diameter.append(float('nan'))
+                geometry.append(geometryLog.missingRecord(i))
+                extraColumns['was_skipped'].append(True)
+                if staticFilter is not None:
+                    extraColumns['carried_over'].append(False)
+                if closedEye is not None:
+                    extraColumns['closed_eye'].append(False)
+                if tracker is not None:
+                    extraColumns['kalman_rejected'].append(False)
+                    extraColumns['kalman_residual_mm'].append(float('nan'))
+                logFrame(i, img)
+                if onProgress is not None and onProgress(len(conf), totalFrames, float('nan'), float('nan')) is False:
+                    cancelled = True
+                    break
+                continue
+            extraColumns['was_skipped'].append(False)
+
+        closed = closedEye is not None and closedEye.isClosed(img)
+        if closedEye is not None:
+            extraColumns['closed_eye'].append(closed)
+        carried = not closed and staticFilter is not None and staticFilter.shouldReuse(img)
+        if staticFilter is not None:
+            extraColumns['carried_over'].append(carried)
+
+        rejected = False
+        if closed:
+            # lid is shut, there is no pupil to find
+            pupil = closedEye.closedPupil
+            if tracker is not None:
+                extraColumns['kalman_rejected'].append(False)
+                extraColumns['kalman_residual_mm'].append(float('nan'))
+        elif carried:
+            # nothing moved since the last detection, its result still holds
+            pupil = lastPupil
+            if tracker is not None:
+                extraColumns['kalman_rejected'].append(False)
+                extraColumns['kalman_residual_mm'].append(float('nan'))
+        elif tracker is not None:
+            pupil, rejected, residual = tracker.track(i, img)
+            extraColumns['kalman_rejected'].append(rejected)
+            extraColumns['kalman_residual_mm'].append(residual)
+        else:
+            pupil = runDetector(img)
+        outline_confidence = pupil.outline_confidence
+        pupil_diameter = pupil.diameter()
+        if closedEye is not None and not closed and not carried:
+            closedEye.detected(img, pupil)
+        if staticFilter is not None and not carried and not closed:
+            # a gated out detection is not worth carrying over either
+            staticFilter.detected(0.0 if rejected else outline_confidence)
+            lastPupil = pupil
+
+        if scheduler is not None and not carried:
+            diameterMm = pupil_diameter / pxToMm if pupil_diameter > 0 else float('nan')
+            scheduler.observeResult(i, diameterMm, outline_confidence)
         
         conf.append(outline_confidence)
         diameter.append(pupil_diameter)
-        util.dprint(f"Showing image {newPath} with detected pupil...")
-        # show the images continuously using cv2 window
-        cv2.imshow("Pupil Detection for " + pathToVideo, imgWithPupil)
-        cv2.waitKey(1)  # Display each image for 1 ms
+        geometry.append(geometryLog.geometryRecord(i, pupil))
+        logFrame(i, img, pupil)
+        if showDetections:
+            util.dprint(f"Showing frame {i} with detected pupil...")
+            # show the images continuously using cv2 window
+            imgWithPupil = ppDetect.drawPupil(img, pupil, pupil_diameter)
+            cv2.imshow("Pupil Detection for " + pathToVideo, imgWithPupil)
+            cv2.waitKey(1)  # Display each image for 1 ms
+
+        if monitor is not None and not monitor.update(outline_confidence, pupil_diameter, rejected):
+            break
+        if onProgress is not None and onProgress(len(conf), totalFrames, pupil_diameter, outline_confidence) is False:
+            cancelled = True
+            break
 
         # closes window after all images are shown
-    cv2.destroyAllWindows()
-    return conf, diameter
+    if showDetections:
+        cv2.destroyAllWindows()
+    if scheduler is not None:
+        util.dprint(f"Adaptive sampling: detected {extraColumns['was_skipped'].count(False)} of {len(conf)} frames")
+    if staticFilter is not None:
+        util.dprint(f"Static frame skip: carried over {sum(extraColumns['carried_over'])} of {len(conf)} frames")
+    if closedEye is not None:
+        util.dprint(f"Blink gate: {sum(extraColumns['closed_eye'])} of {len(conf)} frames closed-eye, not detected")
+    if tracker is not None:
+        util.dprint(f"Kalman tracker: rejected {sum(extraColumns['kalman_rejected'])} of {len(conf)} frames")
+    quality = monitor.summary() if monitor is not None else {'status': 'ok'}
+    if cancelled:
+        util.dprint(f"Detection cancelled after {len(conf)} frames")
+        quality = dict(quality, status='cancelled', reason='cancelled by user')
+    return conf, diameter, extraColumns, quality, geometry
+
+# same outputs as pupilDetection, detection runs in detectionWorkers processes
+def parallelPupilDetection(frames, totalFrames=None, onProgress=None):
+    if useCascade or useAdaptiveSampling or useKalmanTracker or useStaticSkip or useBlinkGate:
+        util.dprint("Parallel detection: cascade/adaptive sampling/kalman tracker/static skip/blink gate are ignored in this mode")
+    monitor = None
+    if useQualityGate:
+        monitor = qualityMonitor.QualityMonitor(totalFrames, confidenceThresh=confidenceThresh, pxToMm=pxToMm)
+    done = 0
+    cancelled = False
+
+    def onResult(result):
+        nonlocal done, cancelled
+        done += 1
+        if monitor is not None and not monitor.update(result[1], result[2]):
+            return False
+        if onProgress is not None and onProgress(done, totalFrames, result[2], result[1]) is False:
+            cancelled = True
+            return False
+
+    results = frameRing.detectParallel(frames, workers=detectionWorkers, algorithm=detectorAlgorithm, onResult=onResult)
+    conf = [r[1] for r in results]
+    diameter = [r[2] for r in results]
+    quality = monitor.summary() if monitor is not None else {'status': 'ok'}
+    if cancelled:
+        quality = dict(quality, status='cancelled', reason='cancelled by user')
+    # the result tuples already are geometry records
+    return conf, diameter, {}, quality, results
+
+# same outputs as pupilDetection, each of decodeChunks workers decodes and detects its own part of the video
+def chunkedPupilDetection(videoPath, totalFrames=None):
+    if useCascade or useAdaptiveSampling or useKalmanTracker or useStaticSkip or useBlinkGate:
+        util.dprint("Chunked detection: cascade/adaptive sampling/kalman tracker/static skip/blink gate are ignored in this mode")
+    results, report = chunkDetect.detectVideoChunks(videoPath, chunks=decodeChunks, algorithm=detectorAlgorithm)
+    if useQualityGate:
+        # chunks run all at once so nothing can stop early, but cut the output where the gate would have
+        monitor = qualityMonitor.QualityMonitor(totalFrames, confidenceThresh=confidenceThresh, pxToMm=pxToMm)
+        for k, result in enumerate(results):
+            if not monitor.update(result[1], result[2]):
+                results = results[:k + 1]
+                break
+        quality = monitor.summary()
+    else:
+        quality = {'status': 'ok'}
+    conf = [r[1] for r in results]
+    diameter = [r[2] for r in results]
+    return conf, diameter, {}, quality, results
 
 def calculateTimeStamps(frameRate, totalFrames):
     timePerFrame = 1.0 / frameRate
@@ -129,7 +415,8 @@ def blinkDetection(image):
     pass
 
 # save data to csv with Columns: 'frame_id', 'timestamp', 'diameter', 'diameter_mm', 'confidence', 'is_bad_data'
-def saveDataToCSV(frameIDs, timestamps, diameters, confidences, outputPath):
+# extraColumns is a dict of extra per-frame columns from detection (e.g. 'was_skipped')
+def saveDataToCSV(frameIDs, timestamps, diameters, confidences, outputPath, extraColumns=None):
     data = {
         'frame_id': frameIDs,
         'timestamp': timestamps,
@@ -137,9 +424,15 @@ def saveDataToCSV(frameIDs, timestamps, diameters, confidences, outputPath):
         'confidence': confidences
     }
     df = pd.DataFrame(data)
-    # Mark bad data points (confidence < 1)
-    df['is_bad_data'] = df['confidence'] < confidenceThresh
+    # Mark bad data points (confidence < 1), skipped frames have no confidence and count as missing
+    df['is_bad_data'] = (df['confidence'] < confidenceThresh) | df['confidence'].isna()
     df['diameter_mm'] = df['diameter'] / pxToMm
+    if extraColumns:
+        for colName, values in extraColumns.items():
+            df[colName] = values
+    # detections the kalman tracker gated out are bad data too
+    if 'kalman_rejected' in df.columns:
+        df['is_bad_data'] = df['is_bad_data'] | df['kalman_rejected']
     df.to_csv(outputPath, index=False)
     util.dprint(f"Data saved to CSV at '{outputPath}'")
     
@@ -149,29 +442,96 @@ def saveDataToCSV(frameIDs, timestamps, diameters, confidences, outputPath):
 
 
 
+# checkpoint for detectSession, None when switched off or in the parallel/chunked modes (they dont write one)
+def openCheckpoint(videoPath):
+    if not useCheckpoint or detectionWorkers > 0 or (useGrayDecode and decodeChunks > 0):
+        return None
+    cap = cv2.VideoCapture(videoPath)
+    frameRate, totalFrames = cap.get(cv2.CAP_PROP_FPS), int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return detectionCheckpoint.DetectionCheckpoint(detectionCheckpoint.checkpointPath(videoPath), frameRate, totalFrames,
+                                                   flushEvery=checkpointEvery, resume=resumeDetection)
+
+
+# frame archive for detectSession, written next to the checkpoint and moved into the session folder at the end
+def openArchive(videoPath, checkpoint=None):
+    if not archiveFrames or detectionWorkers > 0 or (useGrayDecode and decodeChunks > 0):
+        return None
+    cap = cv2.VideoCapture(videoPath)
+    frameRate, width, height = cap.get(cv2.CAP_PROP_FPS), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+    path = os.path.join("checkpoints", os.path.basename(videoPath).split('.')[0] + ".roi")
+    resumeFrom = checkpoint.resumeFrom if checkpoint is not None else 0
+    archive = frameArchive.FrameArchiveWriter(path, frameRate, width, height, resume=resumeFrom > 0, resumeFrom=resumeFrom)
+    if checkpoint is not None:
+        # the archive is synced whenever the checkpoint is, a resume starts where both still have every frame
+        checkpoint.beforeFlush = archive.sync
+        if archive.frames < resumeFrom:
+            util.dprint(f"Frame archive '{path}' only has {archive.frames} frames, resuming from there")
+            checkpoint.rewind(archive.frames)
+    return archive
+
+
+# detect one video and save raw.csv + geometry.bin (+ frames.roi) into data/<video name>/
+# returns (raw dataframe, quality summary, session folder, frame rate), see pupilDetection for onProgress
+def detectSession(videoPath, onProgress=None):
+    checkpoint = openCheckpoint(videoPath)
+    archive = openArchive(videoPath, checkpoint)
+    try:
+        if useGrayDecode:
+            frameRate, totalFrames, conf, diameter, extraColumns, quality, geometry = pupilDetectionInVideo(videoPath, onProgress, checkpoint, archive)
+        else:
+            # the whole video, also when resuming (only the detection of the checkpointed frames is skipped)
+            resetFolder("frames")
+            frameRate, totalFrames = videoToImages(videoPath,"frames")
+
+            #pupilDetectionInFolder("frames/left/")
+            #pupilDetectionInFolder("frames/right/")
+            conf, diameter, extraColumns, quality, geometry = pupilDetectionInFolder("frames/", frameRate, onProgress, checkpoint, archive)
+    finally:
+        # whatever was detected before an error is on disk for resumeDetection
+        if checkpoint is not None:
+            checkpoint.close()
+        if archive is not None:
+            archive.close()
+
+    # the quality gate may have stopped detection early, only keep the frames that were processed
+    totalFrames = len(conf)
+
+    timestamps = calculateTimeStamps(frameRate, totalFrames)
+    dataFolderPath = resetFolder("data/"+os.path.basename(videoPath).split('.')[0])
+    csvDataPath = "data/" + os.path.basename(videoPath).split('.')[0] + "/raw.csv"
+    df = saveDataToCSV(list(range(totalFrames)), timestamps, diameter, conf, csvDataPath, extraColumns)
+    # full ellipse per frame, for re-rendering overlays without detecting again (see geometryLog)
+    geometryLog.saveGeometry(geometry, dataFolderPath + "/geometry.bin", frameRate)
+    # a cancelled run keeps its checkpoint (and archive) so it can be resumed
+    if quality['status'] != 'cancelled':
+        if checkpoint is not None:
+            checkpoint.close(remove=True)
+        if archive is not None:
+            os.replace(archive.path, dataFolderPath + "/frames.roi")
+            os.replace(frameArchive.indexPath(archive.path), frameArchive.indexPath(dataFolderPath + "/frames.roi"))
+    return df, quality, dataFolderPath, frameRate
+
+
 def generateReport():
     util.dprint("Running standalone pupil detection implementation...")
     resetFolder("videos")
     #splitEyes(pathToVideo, pathToLeft, pathToRight, 600)
-    resetFolder("frames")
     #resetFolder("frames/left")
     #resetFolder("frames/right")
     #videoToImages(pathToLeft,"left")
     #videoToImages(pathToRight,"right")
-    frameRate, totalFrames = videoToImages(pathToVideo,"frames")
-
-    #pupilDetectionInFolder("frames/left/")
-    #pupilDetectionInFolder("frames/right/")
-    conf, diameter = pupilDetectionInFolder("frames/")
-
-
-
-    timestamps = calculateTimeStamps(frameRate, totalFrames)
-    dataFolderPath = resetFolder("data/"+os.path.basename(pathToVideo).split('.')[0])
-    csvDataPath = "data/" + os.path.basename(pathToVideo).split('.')[0] + "/raw.csv"
-    df = saveDataToCSV(list(range(totalFrames)), timestamps, diameter, conf, csvDataPath)
+    df, quality, dataFolderPath, frameRate = detectSession(pathToVideo)
+    if quality['status'] != 'ok':
+        util.dprint(f"Trial stopped after {len(df)} frames ({quality['status']}): {quality['reason']}")
+        util.dprint(f"Partial data kept at '{dataFolderPath}/raw.csv', skipping plots")
+        return quality
     print(("Average pupil diameter (pixels): ", getAverageOfColumn(df, 'diameter')))
+    # matplotlib only when there is something to plot, detection workers import main too
+    import scripts.others.graph as graph
     graph.plotResults(df, savePath=dataFolderPath + "/rawPlot.png", showPlot=True, showMm=True)
+    return quality
 
     # first pass preprocessing
     #df = preProcessFirstPass(df)
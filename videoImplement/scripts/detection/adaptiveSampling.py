@@ -0,0 +1,87 @@
+# adaptive temporal sampling for the detection loop
+# protocol: 3s baseline - 0.25s blue - 60s rest - 0.25s red - 60s rest
+# the metrics only need full frame rate around each flash (baseline, TPLR start, dip, recovery)
+# during the long rests the 10-30s AUC is fine with a coarse trace, so we only detect every few frames there
+# skipped frames stay in the timeline as NaN and get filled by the interpolation pass
+import numpy as np
+from scripts.others.util import dprint
+
+# expected flash onsets from the protocol (seconds), used so the window can start BEFORE the flash
+protocolOnsets = (3.0, 63.25)
+
+
+def frameBrightness(img, step=8):
+    # mean luma on a strided grid, ~1/64 of the pixels is plenty to see the flash
+    return float(img[::step, ::step].mean())
+
+
+class AdaptiveScheduler:
+    def __init__(self, fps, restFps=10, preOnset=2.0, postOnset=8.0, onsetTolerance=3.0,
+                 burstSeconds=1.0, velocityThresh=1.5, confidenceJump=0.3, confidenceThresh=0.75,
+                 brightnessJump=15.0, onsets=protocolOnsets):
+        self.fps = fps
+        # detect every restStep-th frame outside the full rate windows
+        self.restStep = max(1, int(round(fps / restFps)))
+        self.preFrames = int(preOnset * fps)
+        self.postFrames = int(postOnset * fps)
+        self.burstFrames = int(burstSeconds * fps)
+        self.velocityThresh = velocityThresh  # mm/s between detected samples
+        self.confidenceJump = confidenceJump
+        self.confidenceThresh = confidenceThresh
+        self.brightnessJump = brightnessJump  # grey levels above the running brightness
+
+        # full rate windows as [start, end] frame ranges
+        # protocol windows are widened by onsetTolerance because the real flash timing drifts a bit
+        self.windows = []
+        for onset in onsets:
+            onsetFrame = int(onset * fps)
+            self.windows.append([max(0, onsetFrame - self.preFrames - int(onsetTolerance * fps)), onsetFrame + self.postFrames + int(onsetTolerance * fps)])
+
+        self.detectedOnsets = []
+        self.burstUntil = -1
+        self.lastDetected = None  # (frame, diameter_mm, confidence)
+        self.runningBrightness = None
+        self.lastStep = -1
+
+    def observeFrame(self, frameIndex, img):
+        # look for the flash in the frame brightness, cheap enough to run on every frame
+        brightness = frameBrightness(img)
+        if self.runningBrightness is None:
+            self.runningBrightness = brightness
+            return
+        if brightness - self.runningBrightness > self.brightnessJump and (len(self.detectedOnsets) == 0 or frameIndex - self.detectedOnsets[-1] > self.postFrames):
+            dprint(f"Frame {frameIndex}: stimulus onset detected (brightness {brightness:.1f} vs {self.runningBrightness:.1f})")
+            self.detectedOnsets.append(frameIndex)
+            self.windows.append([max(0, frameIndex - self.preFrames), frameIndex + self.postFrames])
+        # slow running average so the flash itself doesnt become the new normal
+        self.runningBrightness = 0.95 * self.runningBrightness + 0.05 * brightness
+
+    def inFullRateWindow(self, frameIndex):
+        if frameIndex <= self.burstUntil:
+            return True
+        for start, end in self.windows:
+            if start <= frameIndex <= end:
+                return True
+        return False
+
+    def shouldDetect(self, frameIndex):
+        if self.inFullRateWindow(frameIndex) or frameIndex - self.lastStep >= self.restStep:
+            self.lastStep = frameIndex
+            return True
+        return False
+
+    def observeResult(self, frameIndex, diameterMm, confidence):
+        # go back to full rate for a bit if the trace changes sharply
+        if self.lastDetected is not None:
+            lastFrame, lastDiameter, lastConfidence = self.lastDetected
+            dt = (frameIndex - lastFrame) / self.fps
+            sharp = False
+            if dt > 0 and not np.isnan(diameterMm) and not np.isnan(lastDiameter):
+                sharp = abs(diameterMm - lastDiameter) / dt > self.velocityThresh
+            if abs(confidence - lastConfidence) > self.confidenceJump or confidence < self.confidenceThresh:
+                sharp = True
+            if sharp and frameIndex > self.burstUntil:
+                dprint(f"Frame {frameIndex}: sharp change, detecting at full rate for {self.burstFrames} frames")
+            if sharp:
+                self.burstUntil = frameIndex + self.burstFrames
+        self.lastDetected = (frameIndex, diameterMm, confidence)
@@ -0,0 +1,91 @@
+# cheap closed-eye check that runs before the detector
+# on a blink frame there is no pupil, PuReST still does its full search and returns a low confidence that
+# confidenceFilter throws away later. the pupil is the darkest thing around itself, so with the lid closed the
+# dark pixels in the eye region are (mostly) gone:
+#   - eye region = square of margin * major axis around the last confident pupil, shrunk to a small thumbnail
+#   - on confident detections learn how dark the pupil is (darkest percentile + darkMargin grey levels)
+#     and which fraction of the region is that dark with the eye open
+#   - a frame whose dark fraction drops under closedRatio of the open-eye fraction is called closed
+# nothing is called closed before minCalibration confident frames, and after recheckEvery closed frames in a row
+# the detector runs again anyway, so a wrong call can never blank out a long stretch
+import cv2
+import numpy as np
+
+
+class ClosedPupil:
+    # what a blink frame gets instead of a detection, looks like pypupilext's "no pupil found"
+    center = (-1.0, -1.0)
+    angle = -1.0
+    outline_confidence = 0.0
+
+    def minorAxis(self):
+        return -1.0
+
+    def majorAxis(self):
+        return -1.0
+
+    def diameter(self):
+        return -1.0
+
+
+class ClosedEyeClassifier:
+    def __init__(self, confidenceThresh=0.75, closedRatio=0.25, darkMargin=20.0, margin=3.0, thumbSize=48,
+                 minCalibration=10, recheckEvery=15, smoothing=0.05):
+        self.confidenceThresh = confidenceThresh
+        self.closedRatio = closedRatio
+        self.darkMargin = darkMargin  # grey levels above the pupil that still count as dark
+        self.margin = margin
+        self.thumbSize = thumbSize
+        self.minCalibration = minCalibration
+        self.recheckEvery = recheckEvery
+        self.smoothing = smoothing  # weight of the newest open-eye frame in the running references
+        self.region = None  # (x, y, side) around the last confident pupil, whole frame until then
+        self.pupilLevel = None
+        self.openFraction = None
+        self.calibrated = 0
+        self.closedRun = 0
+        self.thumb = None
+        self.lastFraction = float('nan')
+        self.closedPupil = ClosedPupil()
+
+    def thumbnail(self, img):
+        if self.region is None:
+            crop = img
+        else:
+            x, y, side = self.region
+            crop = img[y:y + side, x:x + side]
+        return cv2.resize(crop, (self.thumbSize, self.thumbSize), dst=self.thumb, interpolation=cv2.INTER_AREA)
+
+    def darkFraction(self, thumb):
+        return float(np.count_nonzero(thumb < self.pupilLevel + self.darkMargin)) / thumb.size
+
+    def isClosed(self, img):
+        # True = treat this frame as a blink and dont run the detector on it
+        self.thumb = self.thumbnail(img)
+        if self.calibrated < self.minCalibration or self.closedRun >= self.recheckEvery:
+            self.closedRun = 0
+            self.lastFraction = float('nan')
+            return False
+        self.lastFraction = self.darkFraction(self.thumb)
+        if self.lastFraction < self.closedRatio * self.openFraction:
+            self.closedRun += 1
+            return True
+        self.closedRun = 0
+        return False
+
+    def detected(self, img, pupil):
+        # call after a real detection on the frame passed to isClosed
+        if pupil.outline_confidence < self.confidenceThresh or pupil.diameter() <= 0:
+            return
+        # the region follows the pupil, the open-eye references are measured in the new region
+        side = max(1, int(self.margin * pupil.majorAxis()))
+        self.region = (max(0, int(round(pupil.center[0] - side / 2))), max(0, int(round(pupil.center[1] - side / 2))), side)
+        self.thumb = self.thumbnail(img)
+        level = float(np.percentile(self.thumb, 2))
+        if self.pupilLevel is None:
+            self.pupilLevel = level
+            self.openFraction = self.darkFraction(self.thumb)
+        else:
+            self.pupilLevel += self.smoothing * (level - self.pupilLevel)
+            self.openFraction += self.smoothing * (self.darkFraction(self.thumb) - self.openFraction)
+        self.calibrated += 1
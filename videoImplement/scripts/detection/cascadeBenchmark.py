@@ -0,0 +1,117 @@
+# compare cascadeDetect against running PuReST on the whole full resolution frame
+# reports speedup and how well the diameters agree, on synthetic frames (known truth) and real videos
+# run from videoImplement/:
+#   python -m scripts.detection.cascadeBenchmark ../eyeVids/tuna/PLR_Tuna_R_1920x1080_30_3.mp4 ...
+import sys
+import time
+import cv2
+import numpy as np
+import pandas as pd
+import scripts.detection.ppDetect as ppDetect
+import scripts.detection.cascadeDetect as cascadeDetect
+import scripts.others.synthetic as synthetic
+from scripts.others.util import dprint
+from config import confidenceThresh, pxToMm
+
+# (width, height, fps) of our recordings
+resolutions = [(640, 480, 90), (1280, 720, 60), (1920, 1080, 30)]
+syntheticSeconds = 10
+maxVideoFrames = 300
+
+
+def pxToMmForHeight(height):
+    # pxToMm = 30 was measured at 1080p, scale it for the other resolutions
+    return pxToMm * height / 1080
+
+
+def benchmarkFrames(frames, pxToMmHere, truths=None, scale=0.5, mmPrecision=0.1):
+    fullDetector = ppDetect.makeDetector()
+    coarseDetector, fineDetector = cascadeDetect.makeCascadeDetectors()
+    fullTimes, cascadeTimes = [], []
+    fullDiam, cascadeDiam, fullConf, cascadeConf = [], [], [], []
+    refinedCount = 0
+
+    for img in frames:
+        t0 = time.perf_counter()
+        full = fullDetector.runWithConfidence(img)
+        t1 = time.perf_counter()
+        pupil, refined = cascadeDetect.cascadeDetect(img, coarseDetector, fineDetector, scale=scale, confidenceThresh=confidenceThresh, pxToMm=pxToMmHere, mmPrecision=mmPrecision)
+        t2 = time.perf_counter()
+
+        fullTimes.append(t1 - t0)
+        cascadeTimes.append(t2 - t1)
+        fullDiam.append(full.diameter())
+        cascadeDiam.append(pupil.diameter())
+        fullConf.append(full.outline_confidence)
+        cascadeConf.append(pupil.outline_confidence)
+        refinedCount += int(refined)
+
+    fullDiam = np.array(fullDiam, dtype=float)
+    cascadeDiam = np.array(cascadeDiam, dtype=float)
+    # only compare frames where both paths found a confident pupil
+    both = (np.array(fullConf) >= confidenceThresh) & (np.array(cascadeConf) >= confidenceThresh) & (fullDiam > 0) & (cascadeDiam > 0)
+    diffMm = np.abs(fullDiam[both] - cascadeDiam[both]) / pxToMmHere
+
+    result = {
+        'frames': len(fullTimes),
+        'full_ms_per_frame': 1000 * np.mean(fullTimes),
+        'cascade_ms_per_frame': 1000 * np.mean(cascadeTimes),
+        'speedup': np.sum(fullTimes) / np.sum(cascadeTimes),
+        'refined_percent': 100.0 * refinedCount / max(1, len(fullTimes)),
+        'agree_frames': int(both.sum()),
+        'mean_abs_diff_mm': diffMm.mean() if len(diffMm) else np.nan,
+        'max_abs_diff_mm': diffMm.max() if len(diffMm) else np.nan,
+    }
+    if truths is not None:
+        truths = np.array(truths, dtype=float)
+        result['full_error_mm'] = np.nanmean(np.abs(fullDiam - truths)[fullDiam > 0]) / pxToMmHere
+        result['cascade_error_mm'] = np.nanmean(np.abs(cascadeDiam - truths)[cascadeDiam > 0]) / pxToMmHere
+    return result
+
+
+def syntheticFrames(width, height, fps):
+    frames, truths = [], []
+    for frame, truth in synthetic.syntheticSession(width, height, fps, syntheticSeconds, pxToMm=pxToMmForHeight(height)):
+        frames.append(frame)
+        truths.append(truth)
+    return frames, truths
+
+
+def videoFrames(videoPath, maxFrames=maxVideoFrames):
+    cam = cv2.VideoCapture(videoPath)
+    frames = []
+    while len(frames) < maxFrames:
+        ret, frame = cam.read()
+        if not ret:
+            break
+        frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+    cam.release()
+    return frames
+
+
+def runBenchmark(videoPaths):
+    rows = []
+    for width, height, fps in resolutions:
+        dprint(f"Synthetic session {width}x{height} @ {fps}fps")
+        frames, truths = syntheticFrames(width, height, fps)
+        row = benchmarkFrames(frames, pxToMmForHeight(height), truths)
+        row['session'] = f"synthetic_{width}x{height}_{fps}"
+        rows.append(row)
+
+    for videoPath in videoPaths:
+        dprint(f"Real session '{videoPath}'")
+        frames = videoFrames(videoPath)
+        if len(frames) == 0:
+            dprint(f"Could not read frames from '{videoPath}', skipping")
+            continue
+        row = benchmarkFrames(frames, pxToMmForHeight(frames[0].shape[0]))
+        row['session'] = videoPath
+        rows.append(row)
+
+    report = pd.DataFrame(rows).set_index('session')
+    print(report.to_string())
+    return report
+
+
+if __name__ == "__main__":
+    runBenchmark(sys.argv[1:])
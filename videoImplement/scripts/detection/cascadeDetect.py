@@ -0,0 +1,71 @@
+# coarse-to-fine pupil detection
+# 1. run the detector on a downscaled frame (scale 0.5 -> 1/4 of the pixels) to find the pupil
+# 2. only if the coarse result is not good enough, re-run on a full resolution crop around it
+# "not good enough" = confidence below confidenceThresh, or the coarse pixel grid is too rough
+# for the mm precision we want (1 coarse pixel = 1/scale full pixels = 1/(scale*pxToMm) mm)
+import cv2
+import numpy as np
+import scripts.detection.ppDetect as ppDetect
+
+
+class ScaledPupil:
+    # looks like a pypupilext Pupil but in full resolution frame coordinates
+    def __init__(self, pupil, scale=1.0, offset=(0, 0)):
+        self.center = (pupil.center[0] * scale + offset[0], pupil.center[1] * scale + offset[1])
+        self.angle = pupil.angle
+        self.outline_confidence = pupil.outline_confidence
+        self._minor = pupil.minorAxis() * scale
+        self._major = pupil.majorAxis() * scale
+        self._diameter = pupil.diameter() * scale if pupil.diameter() > 0 else pupil.diameter()
+
+    def minorAxis(self):
+        return self._minor
+
+    def majorAxis(self):
+        return self._major
+
+    def diameter(self):
+        return self._diameter
+
+
+def makeCascadeDetectors(coarseAlgorithm="PuReST", fineAlgorithm="PuRe"):
+    # the coarse detector always sees the same downscaled frame so PuReST can keep tracking
+    # the fine detector sees crops that move around, so a non-tracking detector is used there
+    return ppDetect.makeDetector(coarseAlgorithm), ppDetect.makeDetector(fineAlgorithm)
+
+
+def coarseStepMm(scale, pxToMm):
+    return (1.0 / scale) / pxToMm
+
+
+def cropAround(img, center, halfSize):
+    h, w = img.shape[:2]
+    x0 = max(0, int(center[0] - halfSize))
+    y0 = max(0, int(center[1] - halfSize))
+    x1 = min(w, int(center[0] + halfSize))
+    y1 = min(h, int(center[1] + halfSize))
+    # pypupilext wants contiguous memory, slicing alone gives a strided view
+    return np.ascontiguousarray(img[y0:y1, x0:x1]), (x0, y0)
+
+
+def cascadeDetect(img, coarseDetector, fineDetector, scale=0.5, confidenceThresh=0.75, pxToMm=30, mmPrecision=0.1, cropMargin=2.0, minCropHalf=32):
+    # returns (pupil in full resolution coordinates, whether the fine stage ran)
+    small = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    coarse = ScaledPupil(coarseDetector.runWithConfidence(small), scale=1.0 / scale)
+
+    found = coarse.diameter() > 0
+    if found and coarse.outline_confidence >= confidenceThresh and coarseStepMm(scale, pxToMm) <= mmPrecision:
+        return coarse, False
+
+    if not found:
+        # nothing to crop around, fall back to the full frame
+        return ScaledPupil(fineDetector.runWithConfidence(img)), True
+
+    halfSize = max(minCropHalf, coarse.majorAxis() * cropMargin)
+    crop, offset = cropAround(img, coarse.center, halfSize)
+    fine = ScaledPupil(fineDetector.runWithConfidence(crop), offset=offset)
+
+    # keep the coarse answer if refining made things worse (e.g. crop cut the pupil off)
+    if fine.diameter() <= 0 or fine.outline_confidence < coarse.outline_confidence:
+        return coarse, True
+    return fine, True
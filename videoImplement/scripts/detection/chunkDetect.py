@@ -0,0 +1,115 @@
+# seek-based chunk parallelism: decoding AND detection scale with cores
+# the video is cut into frame ranges (snapped to keyframes when ffprobe can tell us where they are),
+# every worker opens its own decoder, seeks to its range and detects on its own
+# each chunk starts `overlap` frames early:
+#   - PuReST gets a few frames to lock on before the frames that count
+#   - those frames were also decoded by the previous chunk, so comparing them catches a bad seek
+# results are stitched back together by frame_id
+import shutil
+import subprocess
+import cv2
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import scripts.detection.ppDetect as ppDetect
+import scripts.detection.geometryLog as geometryLog
+from scripts.others.frameSource import GrayFrameSource
+from scripts.others.util import dprint
+
+
+def keyframeIndices(videoPath, fps):
+    # frame numbers of the keyframes, None if ffprobe is not installed or fails
+    if not shutil.which("ffprobe"):
+        return None
+    command = ["ffprobe", "-v", "error", "-select_streams", "v:0", "-skip_frame", "nokey",
+               "-show_entries", "frame=best_effort_timestamp_time", "-of", "csv=p=0", videoPath]
+    try:
+        out = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    times = [float(line.strip(" ,")) for line in out.splitlines() if line.strip(" ,") not in ("", "N/A")]
+    return sorted(set(int(round(t * fps)) for t in times))
+
+
+def chunkBoundaries(totalFrames, chunks, keyframes=None):
+    # even split, each cut moved to the closest keyframe if we know them
+    cuts = [round(k * totalFrames / chunks) for k in range(1, chunks)]
+    if keyframes:
+        keyframes = np.asarray(keyframes)
+        cuts = [int(keyframes[np.argmin(np.abs(keyframes - cut))]) for cut in cuts]
+    edges = sorted(set([0] + [c for c in cuts if 0 < c < totalFrames] + [totalFrames]))
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def fingerprint(img):
+    # tiny thumbnail of the frame, identical frames give (almost) identical thumbnails
+    return cv2.resize(img, (16, 16), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+def _detectChunk(job):
+    videoPath, start, end, overlap, algorithm = job
+    warmStart = max(0, start - overlap)
+    source = GrayFrameSource(videoPath, start=warmStart, end=end)
+    detector = ppDetect.makeDetector(ppDetect.resolveAlgorithm(algorithm, source.width, source.height))
+    records = []
+    prints = {}
+    for frameIndex, img in source:
+        pupil = ppDetect.detectFrame(img, detector)
+        records.append(geometryLog.geometryRecord(frameIndex, pupil))
+        # frames shared with the neighbouring chunks
+        if frameIndex < start or (end is not None and frameIndex >= end - overlap):
+            prints[frameIndex] = fingerprint(img)
+    return start, end, records, prints
+
+
+def detectVideoChunks(videoPath, chunks=None, overlap=5, algorithm="PuReST", diameterTolerance=2.0):
+    # returns (geometry records sorted by frame_id for every frame, stitch report dict)
+    cap = cv2.VideoCapture(videoPath)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video '{videoPath}'")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    totalFrames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    chunks = chunks or cv2.getNumberOfCPUs()
+    keyframes = keyframeIndices(videoPath, fps)
+    bounds = chunkBoundaries(totalFrames, chunks, keyframes)
+    dprint(f"Chunked detection of '{videoPath}': {totalFrames} frames in {len(bounds)} chunks, keyframe aligned: {keyframes is not None}")
+
+    # the last chunk reads to the end of the file, CAP_PROP_FRAME_COUNT is only an estimate for some containers
+    jobs = [(videoPath, start, end if k < len(bounds) - 1 else None, overlap, algorithm) for k, (start, end) in enumerate(bounds)]
+    with ProcessPoolExecutor(max_workers=len(jobs)) as pool:
+        results = list(pool.map(_detectChunk, jobs))
+
+    stitched = {}
+    report = {'chunks': len(bounds), 'overlap_frames': 0, 'seek_mismatches': 0, 'diameter_mismatches': 0}
+    previous = None
+    for start, end, records, prints in results:
+        byFrame = {r[0]: r for r in records}
+        if previous is not None:
+            prevByFrame, prevPrints = previous
+            for frameIndex in range(max(0, start - overlap), start):
+                if frameIndex not in prevByFrame or frameIndex not in byFrame:
+                    continue
+                report['overlap_frames'] += 1
+                # the decoded pixels must match, otherwise the seek landed on the wrong frame
+                if np.max(np.abs(prevPrints[frameIndex] - prints[frameIndex])) > 2.0:
+                    report['seek_mismatches'] += 1
+                # the detections only have to roughly agree, the new chunk's tracker is still warming up
+                old, new = prevByFrame[frameIndex][2], byFrame[frameIndex][2]
+                if old > 0 and new > 0 and abs(old - new) > diameterTolerance:
+                    report['diameter_mismatches'] += 1
+        # the warm up frames belong to the previous chunk, keep its results
+        for frameIndex, record in byFrame.items():
+            if frameIndex >= start and (end is None or frameIndex < end):
+                stitched[frameIndex] = record
+        previous = (byFrame, prints)
+
+    if report['seek_mismatches']:
+        dprint(f"WARNING: {report['seek_mismatches']} of {report['overlap_frames']} overlap frames decoded differently between chunks, seeking is not frame accurate for this file")
+    if report['diameter_mismatches']:
+        dprint(f"Chunk overlap: {report['diameter_mismatches']} of {report['overlap_frames']} frames differ by more than {diameterTolerance}px between chunks")
+    missing = totalFrames - len(stitched)
+    if missing > 0:
+        dprint(f"WARNING: {missing} frames were not decoded by any chunk")
+    report['missing_frames'] = max(0, missing)
+    return [stitched[k] for k in sorted(stitched)], report
@@ -0,0 +1,104 @@
+# on-disk checkpoint for long detection runs
+# conf/diameter used to only live in python lists until saveDataToCSV at the very end, so a crash 40 minutes
+# into a 1080p video lost everything. now every frame's result is appended to checkpoints/<video name>.bin
+# in batches of flushEvery frames (flushed + fsynced), a crash costs at most one batch
+# with resume=True the frames already in the checkpoint are loaded back and detection continues after them
+# file layout: 24 byte header (magic, version, fps, frame count) then one fixed size record per frame,
+# the geometry log record plus the extra per-frame columns. a torn last record (crash mid write) is dropped
+import os
+import numpy as np
+from scripts.detection.geometryLog import recordDtype as geometryDtype
+from scripts.others.util import dprint
+
+magic = b'PCHK'
+version = 2
+headerDtype = np.dtype([('magic', 'S4'), ('version', '<u4'), ('fps', '<f8'), ('total_frames', '<u8')])
+# extra columns pupilDetection may have, bool columns are stored as 0/1
+extraFields = [('was_skipped', '<u1'), ('carried_over', '<u1'), ('kalman_rejected', '<u1'), ('closed_eye', '<u1'), ('kalman_residual_mm', '<f4')]
+boolColumns = ['was_skipped', 'carried_over', 'kalman_rejected', 'closed_eye']
+recordDtype = np.dtype(geometryDtype.descr + extraFields)
+
+
+def checkpointPath(videoPath, folder="checkpoints"):
+    return os.path.join(folder, os.path.basename(videoPath).split('.')[0] + ".bin")
+
+
+class DetectionCheckpoint:
+    def __init__(self, path, fps, totalFrames=0, flushEvery=300, resume=False):
+        self.path = path
+        self.flushEvery = flushEvery
+        self.pending = []
+        # called before every flush, so outputs written next to the checkpoint (frame archive) hit the disk first
+        self.beforeFlush = None
+        self.restored = np.zeros(0, dtype=recordDtype)
+        if resume and os.path.exists(path):
+            self.restored = self.load(fps, totalFrames)
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(np.array([(magic, version, fps, totalFrames or 0)], dtype=headerDtype).tobytes())
+        self.file = open(path, 'ab')
+
+    def load(self, fps, totalFrames):
+        header = np.fromfile(self.path, dtype=headerDtype, count=1)
+        if len(header) == 0 or header['magic'][0] != magic or header['version'][0] != version:
+            raise ValueError(f"'{self.path}' is not a version {version} detection checkpoint")
+        if abs(header['fps'][0] - fps) > 1e-6 or (totalFrames and header['total_frames'][0] not in (0, totalFrames)):
+            raise ValueError(f"checkpoint '{self.path}' is for a {header['fps'][0]} fps / {header['total_frames'][0]} frame video, "
+                             f"this one is {fps} fps / {totalFrames} frames")
+        # drop a half written record at the end, the file is appended to from there
+        size = os.path.getsize(self.path) - headerDtype.itemsize
+        whole = size // recordDtype.itemsize
+        if whole * recordDtype.itemsize != size:
+            dprint(f"Checkpoint '{self.path}': dropping a torn record at the end")
+            os.truncate(self.path, headerDtype.itemsize + whole * recordDtype.itemsize)
+        records = np.fromfile(self.path, dtype=recordDtype, offset=headerDtype.itemsize)
+        dprint(f"Checkpoint '{self.path}': resuming after {len(records)} frames")
+        return records
+
+    @property
+    def resumeFrom(self):
+        # first frame index that still has to be detected
+        return len(self.restored)
+
+    def rewind(self, frames):
+        # forget everything from frame index frames on, before detection starts (e.g. the archive got less far)
+        if frames >= len(self.restored):
+            return
+        self.restored = self.restored[:frames]
+        self.file.truncate(headerDtype.itemsize + frames * recordDtype.itemsize)
+
+    def geometry(self):
+        return [tuple(r) for r in self.restored[list(geometryDtype.names)].tolist()]
+
+    def column(self, name):
+        if name in boolColumns:
+            return [bool(v) for v in self.restored[name]]
+        return self.restored[name].astype(float).tolist()
+
+    def append(self, geometryRecord, extras=None):
+        # extras: this frame's value of each extra column, missing ones are stored as False/NaN
+        extras = extras or {}
+        self.pending.append(tuple(geometryRecord) + tuple(extras.get(name, float('nan') if name not in boolColumns else False)
+                                                          for name, _ in extraFields))
+        if len(self.pending) >= self.flushEvery:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        if self.beforeFlush is not None:
+            self.beforeFlush()
+        self.file.write(np.array(self.pending, dtype=recordDtype).tobytes())
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = []
+
+    def close(self, remove=False):
+        # remove=True once the session's real outputs (raw.csv + geometry.bin) are written
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+        if remove and os.path.exists(self.path):
+            os.remove(self.path)
+            dprint(f"Checkpoint '{self.path}' removed")
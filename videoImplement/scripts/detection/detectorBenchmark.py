@@ -0,0 +1,140 @@
+# compare the pypupilext detectors (PuRe, PuReST, ElSe, ...) on the same frames
+# per detector and resolution: latency percentiles, throughput, share of confident frames and
+# diameter error against the synthetic ground truth
+# the winner per resolution is saved to config.detectorRecommendationPath, main picks it up
+# when detectorAlgorithm = "auto"
+# run from videoImplement/:
+#   python -m scripts.detection.detectorBenchmark ../eyeVids/tuna/PLR_Tuna_R_1920x1080_30_3.mp4 ...
+import os
+import sys
+import json
+import time
+import numpy as np
+import pandas as pd
+import pypupilext as pp
+import scripts.detection.ppDetect as ppDetect
+from scripts.detection.cascadeBenchmark import resolutions, pxToMmForHeight, syntheticFrames, videoFrames
+from scripts.others.util import dprint
+from config import confidenceThresh, detectorRecommendationPath
+
+candidates = ["PuRe", "PuReST", "ElSe", "ExCuSe", "Starburst", "Swirski2D"]
+# a detector may lose this much confident share / this many mm of error vs the best one and still win on speed
+shareSlack = 0.02
+errorSlackMm = 0.05
+
+
+def availableDetectors():
+    # not every pypupilext build has every detector
+    return [name for name in candidates if hasattr(pp, name)]
+
+
+def benchmarkDetector(algorithm, frames, pxToMmHere, truths=None):
+    # one detector for the whole frame sequence, like every detection mode in main: PuReST can track
+    # from frame to frame and the latency is detection only
+    detector = ppDetect.makeDetector(algorithm)
+    times, diam, conf = [], [], []
+    for img in frames:
+        t0 = time.perf_counter()
+        pupil = detector.runWithConfidence(img)
+        times.append(time.perf_counter() - t0)
+        diam.append(pupil.diameter())
+        conf.append(pupil.outline_confidence)
+
+    times = np.array(times)
+    diam = np.array(diam, dtype=float)
+    conf = np.array(conf, dtype=float)
+    result = {
+        'algorithm': algorithm,
+        'frames': len(times),
+        'p50_ms': 1000 * np.percentile(times, 50),
+        'p90_ms': 1000 * np.percentile(times, 90),
+        'p99_ms': 1000 * np.percentile(times, 99),
+        'throughput_fps': len(times) / np.sum(times),
+        'confident_share': np.mean((conf >= confidenceThresh) & (diam > 0)),
+    }
+    if truths is not None:
+        found = diam > 0
+        truths = np.array(truths, dtype=float)
+        result['diameter_error_mm'] = np.mean(np.abs(diam - truths)[found]) / pxToMmHere if found.any() else np.nan
+    return result
+
+
+def recommend(rows):
+    # most confident detections first, then accuracy, and among the ones close to the best: the fastest
+    rows = [r for r in rows if r['frames'] > 0]
+    bestShare = max(r['confident_share'] for r in rows)
+    good = [r for r in rows if r['confident_share'] >= bestShare - shareSlack]
+    errors = [r.get('diameter_error_mm', np.nan) for r in good]
+    if not all(np.isnan(errors)):
+        bestError = np.nanmin(errors)
+        good = [r for r, e in zip(good, errors) if not np.isnan(e) and e <= bestError + errorSlackMm]
+    return min(good, key=lambda r: r['p90_ms'])['algorithm']
+
+
+def saveRecommendation(recommendations, path=detectorRecommendationPath):
+    # {"1920x1080": "PuReST", ...}, merged with whatever was saved before
+    saved = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            saved = json.load(f)
+    saved.update(recommendations)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(saved, f, indent=2, sort_keys=True)
+    dprint(f"Detector recommendation saved to '{path}': {saved}")
+    return saved
+
+
+def runBenchmark(videoPaths, algorithms=None, save=True):
+    algorithms = algorithms or availableDetectors()
+    dprint(f"Benchmarking detectors: {algorithms}")
+    rows = []
+    recommendations = {}
+
+    sessions = []
+    for width, height, fps in resolutions:
+        frames, truths = syntheticFrames(width, height, fps)
+        sessions.append((f"synthetic_{width}x{height}_{fps}", frames, truths))
+    for videoPath in videoPaths:
+        frames = videoFrames(videoPath)
+        if len(frames) == 0:
+            dprint(f"Could not read frames from '{videoPath}', skipping")
+            continue
+        sessions.append((videoPath, frames, None))
+
+    byResolution = {}
+    for session, frames, truths in sessions:
+        height, width = frames[0].shape[:2]
+        for algorithm in algorithms:
+            dprint(f"{algorithm} on {session}")
+            row = benchmarkDetector(algorithm, frames, pxToMmForHeight(height), truths)
+            row['session'] = session
+            row['resolution'] = f"{width}x{height}"
+            rows.append(row)
+            byResolution.setdefault(row['resolution'], []).append(row)
+
+    for resolution, resRows in byResolution.items():
+        # pool synthetic and real sessions of the same size, per detector
+        pooled = []
+        for algorithm in algorithms:
+            mine = [r for r in resRows if r['algorithm'] == algorithm]
+            errors = [r['diameter_error_mm'] for r in mine if 'diameter_error_mm' in r]
+            pooled.append({
+                'algorithm': algorithm,
+                'frames': sum(r['frames'] for r in mine),
+                'p90_ms': np.mean([r['p90_ms'] for r in mine]),
+                'confident_share': np.mean([r['confident_share'] for r in mine]),
+                'diameter_error_mm': np.nanmean(errors) if errors and not np.all(np.isnan(errors)) else np.nan,
+            })
+        recommendations[resolution] = recommend(pooled)
+
+    report = pd.DataFrame(rows).set_index(['session', 'algorithm'])
+    print(report.to_string())
+    print(f"Recommended: {recommendations}")
+    if save:
+        saveRecommendation(recommendations)
+    return report, recommendations
+
+
+if __name__ == "__main__":
+    runBenchmark(sys.argv[1:])
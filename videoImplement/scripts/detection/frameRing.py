@@ -0,0 +1,172 @@
+# shared memory frame transport for multi-process detection
+# pickling a 1080p frame through a multiprocessing queue copies 2-6 MB every time, so instead:
+#   - a ring of preallocated frame slots lives in one shared memory block
+#   - the decoder copies a frame into a free slot and only sends (frame index, slot index) to the workers
+#   - workers detect straight from the slot and send back a small result tuple, then free the slot
+# running out of free slots blocks the decoder, so memory use is fixed no matter how long the video is
+# a worker that raises sends its exception back and it is raised in the parent, a worker that dies (crash in the
+# detector) is noticed while waiting on the queues. either way the pool is terminated and the ring unlinked
+import queue
+import pickle
+import traceback
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+import scripts.detection.ppDetect as ppDetect
+import scripts.detection.geometryLog as geometryLog
+from scripts.others.util import dprint
+
+# how often the parent checks its workers are still alive while it waits on a queue
+pollSeconds = 0.5
+
+
+class WorkerTraceback(Exception):
+    # the worker side traceback, attached as __cause__ of the exception raised in the parent
+    pass
+
+
+class FrameRing:
+    def __init__(self, slots, height, width, name=None):
+        self.slots = slots
+        self.height = height
+        self.width = width
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=slots * height * width)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.frames = np.ndarray((slots, height, width), dtype=np.uint8, buffer=self.shm.buf)
+
+    def spec(self):
+        # everything a worker needs to attach to the same ring
+        return (self.slots, self.height, self.width, self.shm.name)
+
+    @classmethod
+    def attach(cls, spec):
+        slots, height, width, name = spec
+        return cls(slots, height, width, name=name)
+
+    def close(self):
+        self.frames = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _detectionWorker(spec, jobs, results, freeSlots, algorithm):
+    ring = FrameRing.attach(spec)
+    try:
+        detector = ppDetect.makeDetector(ppDetect.resolveAlgorithm(algorithm, ring.width, ring.height))
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            frameIndex, slot = job
+            pupil = ppDetect.detectFrame(ring.frames[slot], detector)
+            # result tuple is a geometry log record: (frame, confidence, diameter, center x/y, minor, major, angle)
+            results.put(geometryLog.geometryRecord(frameIndex, pupil))
+            freeSlots.put(slot)
+    except Exception as e:
+        try:
+            pickle.dumps(e)
+        except Exception:
+            e = RuntimeError(repr(e))
+        results.put(('error', e, traceback.format_exc()))
+    finally:
+        ring.close()
+
+
+def detectParallel(frames, workers=None, slotsPerWorker=4, algorithm="PuReST", onResult=None):
+    # frames: iterable of (frame index, grayscale image), the image buffer may be reused by the source
+    # onResult(result tuple) is called in frame order, return False from it to stop early
+    # returns the result tuples sorted by frame index
+    workers = workers or mp.cpu_count()
+    ring = None
+    jobs, results, freeSlots = mp.Queue(), mp.Queue(), mp.Queue()
+    procs = []
+    done = []
+    pending = {}
+    nextFrame = None
+    submitted = 0
+    stopped = False
+    keep = None
+
+    def waitFor(source):
+        # blocking get that gives up as soon as a worker is gone, workers only exit on the None sent at the end
+        while True:
+            try:
+                return source.get(timeout=pollSeconds)
+            except queue.Empty:
+                dead = [proc for proc in procs if not proc.is_alive()]
+                if dead:
+                    # an error the worker managed to send is more useful than its exit code
+                    while collect(block=False):
+                        pass
+                    raise RuntimeError(f"detection worker {dead[0].pid} died (exit code {dead[0].exitcode})")
+
+    def collect(block):
+        nonlocal nextFrame, stopped, keep
+        try:
+            result = waitFor(results) if block else results.get_nowait()
+        except queue.Empty:
+            return False
+        if result[0] == 'error':
+            raise result[1] from WorkerTraceback(result[2])
+        pending[result[0]] = result
+        # hand results to onResult in frame order
+        while nextFrame in pending:
+            ordered = pending.pop(nextFrame)
+            done.append(ordered)
+            if onResult is not None and not stopped and onResult(ordered) is False:
+                stopped = True
+                keep = len(done)
+            nextFrame += 1
+        return True
+
+    try:
+        for frameIndex, img in frames:
+            if ring is None:
+                # size the ring from the first frame
+                ring = FrameRing(workers * slotsPerWorker, img.shape[0], img.shape[1])
+                for slot in range(ring.slots):
+                    freeSlots.put(slot)
+                procs = [mp.Process(target=_detectionWorker, args=(ring.spec(), jobs, results, freeSlots, algorithm), daemon=True) for _ in range(workers)]
+                for proc in procs:
+                    proc.start()
+                nextFrame = frameIndex
+                dprint(f"Detecting with {workers} workers through a {ring.slots}-slot shared frame ring")
+
+            while collect(block=False):
+                pass
+            if stopped:
+                break
+            slot = waitFor(freeSlots)  # blocks while every slot is in use
+            np.copyto(ring.frames[slot], img)
+            jobs.put((frameIndex, slot))
+            submitted += 1
+
+        # wait for everything that is still in flight
+        while len(done) + len(pending) < submitted:
+            collect(block=True)
+        for _ in procs:
+            jobs.put(None)
+        for proc in procs:
+            proc.join(timeout=10)
+    finally:
+        try:
+            # only does something when we got here through an exception (or a worker hung on the way out)
+            for proc in procs:
+                if proc.is_alive():
+                    proc.terminate()
+                proc.join()
+            for q in (jobs, results, freeSlots):
+                q.cancel_join_thread()
+                q.close()
+        finally:
+            if ring is not None:
+                ring.close()
+
+    if stopped:
+        # frames that were still in flight when onResult said stop are dropped
+        return done[:keep]
+    return done
@@ -0,0 +1,101 @@
+# per-frame ellipse geometry log, saved next to raw.csv as geometry.bin
+# raw.csv only has diameter + confidence, this keeps everything the detector found so overlays,
+# gaze drift checks or a different diameter definition can be redone without running PuReST again
+# file layout: 16 byte header (magic, version, fps) then one fixed size record per frame
+import numpy as np
+import pandas as pd
+from scripts.others.util import dprint
+
+magic = b'PGEO'
+version = 1
+headerDtype = np.dtype([('magic', 'S4'), ('version', '<u4'), ('fps', '<f8')])
+recordDtype = np.dtype([
+    ('frame_id', '<u4'),
+    ('confidence', '<f4'),
+    ('diameter', '<f4'),
+    ('center_x', '<f4'),
+    ('center_y', '<f4'),
+    ('minor_axis', '<f4'),
+    ('major_axis', '<f4'),
+    ('angle', '<f4'),
+])
+
+
+def geometryRecord(frameIndex, pupil):
+    # same order as recordDtype, pupil can be a pypupilext Pupil or anything that looks like one
+    return (frameIndex, pupil.outline_confidence, pupil.diameter(), pupil.center[0], pupil.center[1],
+            pupil.minorAxis(), pupil.majorAxis(), pupil.angle)
+
+
+def missingRecord(frameIndex):
+    # frame kept in the timeline but not detected (e.g. skipped by adaptive sampling)
+    nan = float('nan')
+    return (frameIndex, nan, nan, nan, nan, nan, nan, nan)
+
+
+def saveGeometry(records, path, fps):
+    # records: list of tuples from geometryRecord/missingRecord
+    header = np.array([(magic, version, fps)], dtype=headerDtype)
+    body = np.array(records, dtype=recordDtype)
+    with open(path, 'wb') as f:
+        f.write(header.tobytes())
+        f.write(body.tobytes())
+    dprint(f"Geometry of {len(body)} frames saved to '{path}' ({headerDtype.itemsize + body.nbytes} bytes)")
+    return path
+
+
+def loadGeometry(path, mmap=False):
+    # returns (records as a numpy structured array, fps)
+    # mmap=True maps the file instead of reading it, handy for long sessions
+    header = np.fromfile(path, dtype=headerDtype, count=1)
+    if len(header) == 0 or header['magic'][0] != magic:
+        raise ValueError(f"'{path}' is not a geometry log")
+    if header['version'][0] != version:
+        raise ValueError(f"'{path}' has geometry log version {header['version'][0]}, expected {version}")
+    if mmap:
+        records = np.memmap(path, dtype=recordDtype, mode='r', offset=headerDtype.itemsize)
+    else:
+        records = np.fromfile(path, dtype=recordDtype, offset=headerDtype.itemsize)
+    return records, float(header['fps'][0])
+
+
+def diameterFrom(records, definition='detector'):
+    # diameter in pixels under different definitions, not-found frames (diameter <= 0) become NaN
+    #   'detector' = what pypupilext reported, 'major'/'minor' = one axis, 'mean' = mean of both axes
+    if definition == 'detector':
+        values = records['diameter'].astype(float)
+    elif definition == 'major':
+        values = records['major_axis'].astype(float)
+    elif definition == 'minor':
+        values = records['minor_axis'].astype(float)
+    elif definition == 'mean':
+        values = (records['major_axis'].astype(float) + records['minor_axis'].astype(float)) / 2
+    else:
+        raise ValueError(f"unknown diameter definition '{definition}'")
+    return np.where(records['diameter'] > 0, values, np.nan)
+
+
+def geometryDataFrame(records, fps):
+    df = pd.DataFrame({name: records[name] for name in recordDtype.names})
+    df['timestamp'] = df['frame_id'] / fps
+    return df
+
+
+class LoggedPupil:
+    # one record as a Pupil-like object, so ppDetect.drawPupil works straight from the log
+    def __init__(self, record):
+        self.center = (float(record['center_x']), float(record['center_y']))
+        self.angle = float(record['angle'])
+        self.outline_confidence = float(record['confidence'])
+        self._minor = float(record['minor_axis'])
+        self._major = float(record['major_axis'])
+        self._diameter = float(record['diameter'])
+
+    def minorAxis(self):
+        return self._minor
+
+    def majorAxis(self):
+        return self._major
+
+    def diameter(self):
+        return self._diameter
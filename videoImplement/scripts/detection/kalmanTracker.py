@@ -0,0 +1,128 @@
+# kalman filter pupil tracker
+# state = [x, y, d, vx, vy, vd] (center + diameter in pixels and their velocities), constant velocity model
+# every frame:
+#   1. predict where the pupil will be and how big
+#   2. run the detector only on a crop around the prediction (falls back to the full frame if that fails)
+#   3. reject the detection if it is too far from the prediction (innovation gate), otherwise update
+# this catches the implausible jumps at detection time instead of leaving them for removeSusBio/madFilter
+import numpy as np
+from scripts.detection.cascadeDetect import ScaledPupil, cropAround
+from scripts.others.util import dprint
+
+# chi-square 99% bound for 3 measured values (x, y, d)
+gateChi2 = 11.34
+
+
+class PupilKalman:
+    def __init__(self, fps, pxToMm=30, positionAccelMm=100.0, diameterAccelMm=20.0, positionNoiseMm=0.1, diameterNoiseMm=0.05, maxMisses=5):
+        self.dt = 1.0 / fps
+        self.pxToMm = pxToMm
+        # white noise acceleration, in pixels
+        self.positionAccel = positionAccelMm * pxToMm
+        self.diameterAccel = diameterAccelMm * pxToMm
+        self.R = np.diag([(positionNoiseMm * pxToMm) ** 2, (positionNoiseMm * pxToMm) ** 2, (diameterNoiseMm * pxToMm) ** 2])
+        self.H = np.hstack([np.eye(3), np.zeros((3, 3))])
+        self.maxMisses = maxMisses
+        self.reset()
+
+    def reset(self):
+        self.x = None
+        self.P = None
+        self.misses = 0
+
+    @property
+    def initialized(self):
+        return self.x is not None
+
+    def _transition(self, steps):
+        dt = self.dt * steps
+        F = np.eye(6)
+        F[0, 3] = F[1, 4] = F[2, 5] = dt
+        accel = np.array([self.positionAccel, self.positionAccel, self.diameterAccel]) ** 2
+        Q = np.zeros((6, 6))
+        for k in range(3):
+            Q[k, k] = accel[k] * dt ** 4 / 4
+            Q[k, k + 3] = Q[k + 3, k] = accel[k] * dt ** 3 / 2
+            Q[k + 3, k + 3] = accel[k] * dt ** 2
+        return F, Q
+
+    def predict(self, steps=1):
+        # returns predicted (x, y, d) in pixels, or None before the first detection
+        if not self.initialized:
+            return None
+        F, Q = self._transition(steps)
+        self.x = F @ self.x
+        self.P = F @ self.P @ F.T + Q
+        return self.x[:3].copy()
+
+    def positionSigma(self):
+        return float(np.sqrt(max(self.P[0, 0], self.P[1, 1])))
+
+    def update(self, measurement):
+        # measurement = (x, y, d) in pixels
+        # returns (accepted, diameter residual in pixels)
+        z = np.asarray(measurement, dtype=float)
+        if not self.initialized:
+            self.x = np.concatenate([z, np.zeros(3)])
+            self.P = np.diag([self.R[0, 0], self.R[1, 1], self.R[2, 2], self.positionAccel ** 2 * self.dt ** 2, self.positionAccel ** 2 * self.dt ** 2, self.diameterAccel ** 2 * self.dt ** 2])
+            return True, 0.0
+
+        innovation = z - self.H @ self.x
+        S = self.H @ self.P @ self.H.T + self.R
+        distance = float(innovation @ np.linalg.solve(S, innovation))
+        if distance > gateChi2:
+            self.miss()
+            return False, float(innovation[2])
+
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ innovation
+        self.P = (np.eye(6) - K @ self.H) @ self.P
+        self.misses = 0
+        return True, float(innovation[2])
+
+    def miss(self):
+        # no usable measurement this frame, lose track after too many in a row (e.g. blinks, big saccades)
+        self.misses += 1
+        if self.misses > self.maxMisses:
+            dprint(f"Kalman tracker: {self.misses} misses in a row, resetting")
+            self.reset()
+
+
+class PupilTracker:
+    # wraps a detector function (gray image -> pupil) with the kalman filter
+    def __init__(self, detectFn, fps, pxToMm=30, confidenceThresh=0.75, roiMargin=2.0, minRoiHalf=48, **kalmanArgs):
+        self.detectFn = detectFn
+        self.kalman = PupilKalman(fps, pxToMm=pxToMm, **kalmanArgs)
+        self.pxToMm = pxToMm
+        self.confidenceThresh = confidenceThresh
+        self.roiMargin = roiMargin
+        self.minRoiHalf = minRoiHalf
+        self.lastFrame = None
+
+    def track(self, frameIndex, img):
+        # returns (pupil, rejected, diameter residual in mm)
+        # pupil has full frame coordinates, residual is NaN when there was nothing to compare
+        steps = 1 if self.lastFrame is None else max(1, frameIndex - self.lastFrame)
+        self.lastFrame = frameIndex
+        prediction = self.kalman.predict(steps)
+
+        pupil = None
+        if prediction is not None:
+            halfSize = max(self.minRoiHalf, prediction[2] * self.roiMargin + 3 * self.kalman.positionSigma())
+            roi, offset = cropAround(img, prediction[:2], halfSize)
+            pupil = ScaledPupil(self.detectFn(roi), offset=offset)
+            if pupil.diameter() <= 0 or pupil.outline_confidence < self.confidenceThresh:
+                pupil = None
+        if pupil is None:
+            # no track yet or the roi missed, search the whole frame
+            pupil = ScaledPupil(self.detectFn(img))
+
+        if pupil.diameter() <= 0 or pupil.outline_confidence < self.confidenceThresh:
+            if prediction is not None:
+                self.kalman.miss()
+            return pupil, False, float('nan')
+
+        accepted, residual = self.kalman.update((pupil.center[0], pupil.center[1], pupil.diameter()))
+        if not accepted:
+            dprint(f"Frame {frameIndex}: detection outside the kalman gate (diameter residual {residual / self.pxToMm:.2f} mm), rejected")
+        return pupil, not accepted, residual / self.pxToMm
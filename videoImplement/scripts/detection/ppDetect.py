@@ -2,11 +2,12 @@
 # (づ ￣ ³￣)づ
 
 
+import os
+import json
 import pypupilext as pp
 import cv2
 import pandas as pd
 import time
-import matplotlib.pyplot as plt
 
 #testPath = "/Users/honganh/Documents/nerd folder/smpf thing/implement/videoImplement/frames/left/frame0.bmp"
 testPath = "frames/left/frame0.bmp"
@@ -25,27 +26,66 @@ def ResizeWithAspectRatio(image, width=None, height=None, inter=cv2.INTER_AREA):
     return cv2.resize(image, dim, interpolation=inter)
 
 
-def detect(imagePath):
-    img = cv2.imread(imagePath, cv2.IMREAD_GRAYSCALE)
+# algorithm is any detector class name in pypupilext (PuReST, PuRe, ElSe, ExCuSe, ...)
+def makeDetector(algorithm="PuReST"):
+    pure = getattr(pp, algorithm)()
+    if hasattr(pure, "maxPupilDiameterMM"):
+        pure.maxPupilDiameterMM = 7
+    return pure
+
+
+# one detector per algorithm per process, made on first use and kept for the whole process
+# (a jobServer worker warms it once and every job it runs reuses it, like the frameRing/chunkDetect workers)
+_detectors = {}
+
+
+def processDetector(algorithm="PuReST"):
+    if algorithm not in _detectors:
+        _detectors[algorithm] = makeDetector(algorithm)
+    return _detectors[algorithm]
 
+
+# "auto" = the detector detectorBenchmark recommended for this resolution (or the closest one it measured)
+# anything else is returned as is
+def resolveAlgorithm(algorithm, width, height, default="PuReST"):
+    if algorithm != "auto":
+        return algorithm
+    from config import detectorRecommendationPath
+    if not os.path.exists(detectorRecommendationPath):
+        return default
+    with open(detectorRecommendationPath) as f:
+        recommended = json.load(f)
+    if not recommended:
+        return default
+    key = f"{width}x{height}"
+    if key not in recommended:
+        sizes = {k: int(k.split("x")[0]) * int(k.split("x")[1]) for k in recommended}
+        key = min(sizes, key=lambda k: abs(sizes[k] - width * height))
+    return recommended[key] if hasattr(pp, recommended[key]) else default
+
+
+# run the detector on a grayscale frame that is already in memory
+def detectFrame(img, detector=None):
     pupilClass = pp.Pupil()
     assert pupilClass.confidence == -1
 
-    pure = pp.PuReST()
-    pure.maxPupilDiameterMM = 7
+    if detector is None:
+        detector = makeDetector()
+
+    return detector.runWithConfidence(img)
 
-    im_reized = img
-    pupil = pure.runWithConfidence(im_reized)
-    diam = pupil.diameter()
-    data = pd.DataFrame([{'Outline Conf': pupil.outline_confidence, 'PupilDiameter': diam}])
-    print(data)
 
-    img_bgr = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+# draw the detected ellipse on top of the grayscale frame
+# shrink first and only then convert to BGR, so the colour copy is display sized not full res
+def drawPupil(img, pupil, diam, width=800):
+    r = width / float(img.shape[1])
+    small = ResizeWithAspectRatio(img, width=width)
+    img_bgr = cv2.cvtColor(small, cv2.COLOR_GRAY2BGR)
     if diam is not None and diam >= 0:
         img_plot = cv2.ellipse(
             img_bgr,
-            (int(pupil.center[0]), int(pupil.center[1])),
-            (int(pupil.minorAxis()/2), int(pupil.majorAxis()/2)),
+            (int(pupil.center[0] * r), int(pupil.center[1] * r)),
+            (int(pupil.minorAxis() * r / 2), int(pupil.majorAxis() * r / 2)),
             pupil.angle,
             0,
             360,
@@ -55,7 +95,18 @@ def detect(imagePath):
     else:
         img_plot = img_bgr
 
-    resize = ResizeWithAspectRatio(img_plot, width=800)
+    return img_plot
+
+
+def detect(imagePath, detector=None):
+    img = cv2.imread(imagePath, cv2.IMREAD_GRAYSCALE)
+
+    pupil = detectFrame(img, detector)
+    diam = pupil.diameter()
+    data = pd.DataFrame([{'Outline Conf': pupil.outline_confidence, 'PupilDiameter': diam}])
+    print(data)
+
+    resize = drawPupil(img, pupil, diam)
 
     return resize, pupil.outline_confidence, diam
 
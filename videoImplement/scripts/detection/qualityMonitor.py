@@ -0,0 +1,77 @@
+# online version of badTrial.checkBadTrial that runs inside the detection loop
+# a trial is bad if more than percentageThreshold % of its samples are bad, so we can stop detecting once:
+#   - the bad count alone is already over the limit for the whole video (it can never pass), or
+#   - the running bad fraction is over the limit with high confidence (Wilson lower bound)
+# bad = confidence under confidenceThresh or diameter outside the 2-9mm biological range
+import math
+from scripts.others.util import dprint
+from scripts.preProcessing.badTrial import percentageThreshold
+
+
+def wilsonLowerBound(bad, n, z=3.0):
+    if n == 0:
+        return 0.0
+    p = bad / n
+    denom = 1 + z * z / n
+    centre = p + z * z / (2 * n)
+    spread = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n))
+    return (centre - spread) / denom
+
+
+class QualityMonitor:
+    def __init__(self, totalFrames, confidenceThresh=0.75, pxToMm=30, minDiameterMm=2.0, maxDiameterMm=9.0,
+                 threshold=percentageThreshold, minFraction=0.2, z=3.0):
+        # totalFrames can be None/0 if the frame count is unknown, then only the statistical stop is used
+        self.totalFrames = totalFrames or 0
+        self.confidenceThresh = confidenceThresh
+        self.pxToMm = pxToMm
+        self.minDiameterMm = minDiameterMm
+        self.maxDiameterMm = maxDiameterMm
+        self.limit = threshold / 100.0
+        # dont trust the statistics before this many frames, blinks come in clumps
+        self.minFrames = max(30, int(minFraction * self.totalFrames))
+        self.z = z
+        self.frames = 0
+        self.lowConfidence = 0
+        self.outOfRange = 0
+        self.rejected = 0
+        self.status = "ok"
+        self.reason = ""
+
+    @property
+    def bad(self):
+        return self.lowConfidence + self.outOfRange + self.rejected
+
+    def update(self, confidence, diameterPx, rejected=False):
+        # call once per detected frame (not for frames skipped on purpose)
+        # returns False once the trial can no longer pass
+        self.frames += 1
+        diameterMm = diameterPx / self.pxToMm if diameterPx is not None and diameterPx > 0 else float('nan')
+        if confidence < self.confidenceThresh:
+            self.lowConfidence += 1
+        elif not (self.minDiameterMm <= diameterMm <= self.maxDiameterMm):
+            self.outOfRange += 1
+        elif rejected:
+            self.rejected += 1
+
+        if self.totalFrames and self.bad > self.limit * self.totalFrames:
+            self.fail(f"{self.bad} bad frames already exceeds {self.limit * 100:.0f}% of all {self.totalFrames} frames")
+        elif self.frames >= self.minFrames and wilsonLowerBound(self.bad, self.frames, self.z) > self.limit:
+            self.fail(f"bad fraction {100.0 * self.bad / self.frames:.1f}% after {self.frames} frames, lower bound {100.0 * wilsonLowerBound(self.bad, self.frames, self.z):.1f}% > {self.limit * 100:.0f}%")
+        return self.status == "ok"
+
+    def fail(self, reason):
+        self.status = "failed_early"
+        self.reason = reason
+        dprint(f"Quality gate: trial cannot pass, stopping detection ({reason})")
+
+    def summary(self):
+        return {
+            'status': self.status,
+            'reason': self.reason,
+            'frames_checked': self.frames,
+            'low_confidence': self.lowConfidence,
+            'out_of_range': self.outOfRange,
+            'kalman_rejected': self.rejected,
+            'bad_percent': 100.0 * self.bad / self.frames if self.frames else 0.0,
+        }
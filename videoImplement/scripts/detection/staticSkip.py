@@ -0,0 +1,50 @@
+# static frame skipping for the detection loop
+# during steady fixation consecutive frames are almost identical, so instead of running PuReST again
+# we compare a small thumbnail of the frame against the thumbnail of the last DETECTED frame
+# and carry the last result over if nothing moved
+# score = biggest change of any thumbnail cell, not the mean: every cell averages ~100 full res pixels
+# so sensor noise mostly cancels, but a pupil edge moving a few pixels still changes its cells a lot
+# (a mean over the whole frame would hide a constricting pupil)
+import cv2
+import numpy as np
+
+
+class StaticFrameFilter:
+    def __init__(self, diffThresh=4.0, maxReuse=5, thumbWidth=64, confidenceThresh=0.75):
+        self.diffThresh = diffThresh  # grey levels
+        # never carry over more than this many frames in a row, so a slow drift still gets detected
+        self.maxReuse = maxReuse
+        self.thumbWidth = thumbWidth
+        self.confidenceThresh = confidenceThresh
+        self.reference = None  # thumbnail of the last detected frame
+        self.lastConfidence = 0.0
+        self.reused = 0
+        self.thumb = None
+        self.lastScore = float('nan')
+
+    def thumbnail(self, img):
+        height = max(1, int(round(img.shape[0] * self.thumbWidth / img.shape[1])))
+        small = cv2.resize(img, (self.thumbWidth, height), dst=self.thumb, interpolation=cv2.INTER_AREA)
+        return small
+
+    def shouldReuse(self, img):
+        # True = keep the previous detection for this frame
+        self.thumb = self.thumbnail(img)
+        if self.reference is None or self.reused >= self.maxReuse or self.lastConfidence < self.confidenceThresh:
+            self.lastScore = float('nan')
+            return False
+        self.lastScore = float(cv2.absdiff(self.thumb, self.reference).max())
+        if self.lastScore < self.diffThresh:
+            self.reused += 1
+            return True
+        return False
+
+    def detected(self, confidence):
+        # call after a real detection on the frame passed to shouldReuse
+        # only confident results are worth carrying over, blinks get detected every frame
+        if self.reference is None:
+            self.reference = self.thumb.copy()
+        else:
+            np.copyto(self.reference, self.thumb)
+        self.lastConfidence = confidence
+        self.reused = 0
@@ -0,0 +1,134 @@
+# offline annotated video: source video + saved detections (geometry.bin, raw.csv) -> annotated.mp4
+# runs after detection so QA review never slows the detection loop down
+#   - the video is split into frame range chunks, each worker seeks to its range and writes its own mp4
+#   - the chunk files are joined at the end (ffmpeg concat without re-encoding if ffmpeg is installed)
+# drawn per frame: detected ellipse, confidence, frame number and a red border on bad frames
+import os
+import sys
+import shutil
+import subprocess
+import tempfile
+import cv2
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import scripts.detection.geometryLog as geometryLog
+from scripts.others.util import dprint
+from config import confidenceThresh
+
+chunkFrames = 300
+
+
+def frameChunks(totalFrames, chunkSize=chunkFrames):
+    return [(start, min(start + chunkSize, totalFrames)) for start in range(0, totalFrames, chunkSize)]
+
+
+def badFrames(records, csvPath=None):
+    # is_bad_data from raw.csv if we have it, otherwise low confidence / not found from the log
+    if csvPath is not None and os.path.exists(csvPath):
+        df = pd.read_csv(csvPath)
+        if 'is_bad_data' in df.columns:
+            bad = np.ones(len(records), dtype=bool)
+            n = min(len(df), len(records))
+            bad[:n] = df['is_bad_data'].values[:n].astype(bool)
+            return bad
+    conf = records['confidence'].astype(float)
+    return ~(conf >= confidenceThresh) | ~(records['diameter'] > 0)
+
+
+def drawAnnotations(frame, record, isBad):
+    # draws onto frame (BGR, full resolution) in place
+    pupil = geometryLog.LoggedPupil(record)
+    found = pupil.diameter() > 0
+    colour = (0, 0, 255) if isBad else (0, 255, 0)
+    if found:
+        cv2.ellipse(frame, (int(pupil.center[0]), int(pupil.center[1])),
+                    (int(pupil.minorAxis() / 2), int(pupil.majorAxis() / 2)), pupil.angle, 0, 360, colour, 2)
+    scale = frame.shape[0] / 720
+    label = f"frame {int(record['frame_id'])}  conf {pupil.outline_confidence:.2f}" if found else f"frame {int(record['frame_id'])}  no pupil"
+    cv2.putText(frame, label, (int(20 * scale), int(40 * scale)), cv2.FONT_HERSHEY_SIMPLEX, scale, colour, max(1, int(2 * scale)))
+    if isBad:
+        cv2.rectangle(frame, (0, 0), (frame.shape[1] - 1, frame.shape[0] - 1), (0, 0, 255), max(2, int(8 * scale)))
+    return frame
+
+
+def _renderChunk(job):
+    videoPath, geometryPath, csvPath, start, end, outPath = job
+    records, fps = geometryLog.loadGeometry(geometryPath, mmap=True)
+    bad = badFrames(records, csvPath)
+    byFrame = {int(f): k for k, f in enumerate(records['frame_id'])}
+
+    cap = cv2.VideoCapture(videoPath)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    writer = cv2.VideoWriter(outPath, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    written = 0
+    for frameIndex in range(start, end):
+        ret, frame = cap.read()
+        if not ret:
+            break
+        k = byFrame.get(frameIndex)
+        if k is not None:
+            drawAnnotations(frame, records[k], bad[k])
+        writer.write(frame)
+        written += 1
+    writer.release()
+    cap.release()
+    return outPath, written
+
+
+def concatChunks(chunkPaths, outputPath, fps):
+    if not chunkPaths:
+        raise ValueError(f"no annotated chunks to join into '{outputPath}' (no frames rendered)")
+    if shutil.which("ffmpeg"):
+        # same codec and size in every chunk, so ffmpeg can just join the streams
+        listPath = os.path.join(os.path.dirname(chunkPaths[0]), "chunks.txt")
+        with open(listPath, "w") as f:
+            for path in chunkPaths:
+                f.write(f"file '{os.path.abspath(path)}'\n")
+        subprocess.run(["ffmpeg", "-v", "error", "-y", "-f", "concat", "-safe", "0", "-i", listPath, "-c", "copy", outputPath], check=True)
+        return outputPath
+
+    # no ffmpeg: read the chunks back in order and write them into one file
+    writer = None
+    for path in chunkPaths:
+        cap = cv2.VideoCapture(path)
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if writer is None:
+                writer = cv2.VideoWriter(outputPath, cv2.VideoWriter_fourcc(*'mp4v'), fps, (frame.shape[1], frame.shape[0]))
+            writer.write(frame)
+        cap.release()
+    if writer is not None:
+        writer.release()
+    return outputPath
+
+
+def renderAnnotatedVideo(videoPath, sessionFolder, outputPath=None, workers=None, chunkSize=chunkFrames):
+    # sessionFolder is the data/<video name> folder with geometry.bin (and raw.csv)
+    geometryPath = os.path.join(sessionFolder, "geometry.bin")
+    csvPath = os.path.join(sessionFolder, "raw.csv")
+    if outputPath is None:
+        outputPath = os.path.join(sessionFolder, "annotated.mp4")
+    records, fps = geometryLog.loadGeometry(geometryPath)
+    # only render as far as detection went (the quality gate can stop it early)
+    totalFrames = int(records['frame_id'].max()) + 1 if len(records) else 0
+    chunks = frameChunks(totalFrames, chunkSize)
+    dprint(f"Rendering {totalFrames} annotated frames of '{videoPath}' in {len(chunks)} chunks")
+
+    with tempfile.TemporaryDirectory(dir=sessionFolder) as tmp:
+        jobs = [(videoPath, geometryPath, csvPath, start, end, os.path.join(tmp, f"chunk{k:05d}.mp4")) for k, (start, end) in enumerate(chunks)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            done = list(pool.map(_renderChunk, jobs))
+        written = sum(n for _, n in done)
+        concatChunks([path for path, n in done if n > 0], outputPath, fps)
+    dprint(f"Annotated video with {written} frames saved to '{outputPath}'")
+    return outputPath
+
+
+if __name__ == "__main__":
+    # python -m scripts.others.annotateVideo <video> <data/session folder> [output.mp4]
+    renderAnnotatedVideo(sys.argv[1], sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)
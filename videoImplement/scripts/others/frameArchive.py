@@ -0,0 +1,246 @@
+# compact frame archive: only the eye region around the tracked pupil, one container file per session
+# videoToImages writes every frame as a full uncompressed BMP (~6MB each at 1080p), but audit and re-detection
+# only ever look at the pupil. here every frame is cropped to a square around the pupil, PNG compressed
+# (lossless, so re-detection sees exactly the pixels PuReST saw) and appended to one file in chunks
+# file layout:
+#   24 byte header (magic, version, fps, full frame width/height)
+#   per frame: 16 byte record header (frame id, crop x/y/w/h, png length) + png bytes
+# the index (frame id -> file offset + crop) is written next to it as <archive>.idx.npy on close,
+# and rebuilt by scanning the record headers if it is missing (crash before close)
+# write it during detection (main.archiveFrames) or afterwards from the video + geometry.bin (archiveVideo)
+# during detection it is fsynced together with the checkpoint, so a resume never finds the archive behind it
+import os
+import sys
+import cv2
+import numpy as np
+import scripts.detection.geometryLog as geometryLog
+from scripts.others.util import dprint
+from config import confidenceThresh
+
+magic = b'PROI'
+version = 1
+headerDtype = np.dtype([('magic', 'S4'), ('version', '<u4'), ('fps', '<f8'), ('width', '<u4'), ('height', '<u4')])
+recordHeaderDtype = np.dtype([('frame_id', '<u4'), ('x', '<u2'), ('y', '<u2'), ('w', '<u2'), ('h', '<u2'), ('length', '<u4')])
+indexDtype = np.dtype([('frame_id', '<u4'), ('offset', '<u8'), ('x', '<u2'), ('y', '<u2'), ('w', '<u2'), ('h', '<u2'), ('length', '<u4')])
+
+
+def indexPath(path):
+    return path + ".idx.npy"
+
+
+class RoiPicker:
+    # square crop of margin * the pupil's major axis (at least minSize), centred on the pupil
+    # frames without a confident pupil (blinks, skipped frames) reuse the last crop, full frame until the first one
+    def __init__(self, width, height, margin=2.5, minSize=160):
+        self.width = width
+        self.height = height
+        self.margin = margin
+        self.minSize = minSize
+        self.last = (0, 0, width, height)
+
+    def pick(self, pupil=None):
+        if pupil is not None and pupil.outline_confidence >= confidenceThresh and pupil.diameter() > 0:
+            side = int(min(max(self.minSize, self.margin * pupil.majorAxis()), self.width, self.height))
+            x = int(round(pupil.center[0] - side / 2))
+            y = int(round(pupil.center[1] - side / 2))
+            x = min(max(0, x), self.width - side)
+            y = min(max(0, y), self.height - side)
+            self.last = (x, y, side, side)
+        return self.last
+
+
+class FrameArchiveWriter:
+    # resume=True keeps the frames before resumeFrom of an existing archive and appends after them
+    def __init__(self, path, fps, width, height, chunkFrames=64, margin=2.5, minSize=160, resume=False, resumeFrom=0):
+        self.path = path
+        self.chunkFrames = chunkFrames
+        self.roi = RoiPicker(width, height, margin, minSize)
+        self.pending = []
+        self.index = []
+        if resume and os.path.exists(path):
+            kept = scanArchive(path)
+            kept = kept[kept['frame_id'] < resumeFrom]
+            end = int(kept['offset'][-1] + kept['length'][-1]) if len(kept) else headerDtype.itemsize
+            os.truncate(path, end)
+            self.index = [tuple(r) for r in kept.tolist()]
+            self.offset = end
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(np.array([(magic, version, fps, width, height)], dtype=headerDtype).tobytes())
+            self.offset = headerDtype.itemsize
+        self.file = open(path, 'ab')
+        self.rawBytes = 0
+        self.storedBytes = 0
+
+    def add(self, frameIndex, img, pupil=None):
+        # img is the full grayscale frame, pupil the detection on it (None = not detected, reuse the last crop)
+        x, y, w, h = self.roi.pick(pupil)
+        ok, png = cv2.imencode(".png", img[y:y + h, x:x + w])
+        if not ok:
+            raise IOError(f"could not encode frame {frameIndex}")
+        data = png.tobytes()
+        recordHeader = np.array([(frameIndex, x, y, w, h, len(data))], dtype=recordHeaderDtype).tobytes()
+        self.pending.append(recordHeader + data)
+        self.index.append((frameIndex, self.offset + recordHeaderDtype.itemsize, x, y, w, h, len(data)))
+        self.offset += len(recordHeader) + len(data)
+        self.rawBytes += img.nbytes
+        self.storedBytes += len(recordHeader) + len(data)
+        if len(self.pending) >= self.chunkFrames:
+            self.flush()
+
+    @property
+    def frames(self):
+        # first frame index not in the archive yet, frames are always added in order
+        return int(self.index[-1][0]) + 1 if self.index else 0
+
+    def flush(self):
+        if self.pending:
+            self.file.write(b"".join(self.pending))
+            self.file.flush()
+            self.pending = []
+
+    def sync(self):
+        # flush + fsync, the detection checkpoint calls this before each of its own flushes
+        self.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.close()
+        np.save(indexPath(self.path), np.array(self.index, dtype=indexDtype))
+        if self.rawBytes:
+            dprint(f"Frame archive '{self.path}': {len(self.index)} frames, {self.storedBytes / 1e6:.1f} MB "
+                   f"({100.0 * self.storedBytes / self.rawBytes:.1f}% of the raw gray frames)")
+
+
+def readHeader(path):
+    header = np.fromfile(path, dtype=headerDtype, count=1)
+    if len(header) == 0 or header['magic'][0] != magic or header['version'][0] != version:
+        raise ValueError(f"'{path}' is not a version {version} frame archive")
+    return header[0]
+
+
+def scanArchive(path):
+    # rebuild the index from the record headers, a half written last record is left out
+    readHeader(path)
+    size = os.path.getsize(path)
+    index = []
+    with open(path, 'rb') as f:
+        offset = headerDtype.itemsize
+        while offset + recordHeaderDtype.itemsize <= size:
+            f.seek(offset)
+            record = np.frombuffer(f.read(recordHeaderDtype.itemsize), dtype=recordHeaderDtype)[0]
+            dataOffset = offset + recordHeaderDtype.itemsize
+            if dataOffset + int(record['length']) > size:
+                break
+            index.append((record['frame_id'], dataOffset, record['x'], record['y'], record['w'], record['h'], record['length']))
+            offset = dataOffset + int(record['length'])
+    return np.array(index, dtype=indexDtype)
+
+
+class FrameArchive:
+    # random access reader: archive[frameIndex] -> (crop, (x, y)), iterating gives (frame index, crop, (x, y))
+    def __init__(self, path):
+        self.path = path
+        header = readHeader(path)
+        self.fps = float(header['fps'])
+        self.width = int(header['width'])
+        self.height = int(header['height'])
+        self.index = np.load(indexPath(path)) if os.path.exists(indexPath(path)) else scanArchive(path)
+        self.position = {int(f): k for k, f in enumerate(self.index['frame_id'])}
+        self.file = open(path, 'rb')
+
+    def __len__(self):
+        return len(self.index)
+
+    def read(self, k):
+        entry = self.index[k]
+        self.file.seek(int(entry['offset']))
+        data = np.frombuffer(self.file.read(int(entry['length'])), dtype=np.uint8)
+        return cv2.imdecode(data, cv2.IMREAD_GRAYSCALE), (int(entry['x']), int(entry['y']))
+
+    def __getitem__(self, frameIndex):
+        return self.read(self.position[frameIndex])
+
+    def __iter__(self):
+        for k in range(len(self.index)):
+            crop, offset = self.read(k)
+            yield int(self.index['frame_id'][k]), crop, offset
+
+    def close(self):
+        self.file.close()
+
+
+class ShiftedPupil:
+    # a pupil found on a crop, moved back into full frame coordinates
+    def __init__(self, pupil, offset):
+        self.pupil = pupil
+        # "no pupil found" keeps its (-1, -1) centre
+        found = pupil.diameter() > 0
+        self.center = (pupil.center[0] + offset[0], pupil.center[1] + offset[1]) if found else tuple(pupil.center)
+        self.angle = pupil.angle
+        self.outline_confidence = pupil.outline_confidence
+
+    def minorAxis(self):
+        return self.pupil.minorAxis()
+
+    def majorAxis(self):
+        return self.pupil.majorAxis()
+
+    def diameter(self):
+        return self.pupil.diameter()
+
+
+def detectFromArchive(archivePath, algorithm="PuReST"):
+    # re-run detection on the archived crops, returns geometry log records in full frame coordinates + fps
+    import scripts.detection.ppDetect as ppDetect
+    archive = FrameArchive(archivePath)
+    # the detector only ever sees the crops, "auto" picks for their size and not the full frame's
+    if len(archive.index) > 0:
+        width, height = int(archive.index['w'][0]), int(archive.index['h'][0])
+    else:
+        width, height = archive.width, archive.height
+    algorithm = ppDetect.resolveAlgorithm(algorithm, width, height)
+    # one detector for the whole archive, PuReST tracks from crop to crop like in main
+    detector = ppDetect.makeDetector(algorithm)
+    records = []
+    try:
+        for frameIndex, crop, offset in archive:
+            pupil = ppDetect.detectFrame(crop, detector)
+            records.append(geometryLog.geometryRecord(frameIndex, ShiftedPupil(pupil, offset)))
+    finally:
+        archive.close()
+    dprint(f"Re-detected {len(records)} archived frames with {algorithm}")
+    return records, archive.fps
+
+
+def archiveVideo(videoPath, sessionFolder, outputPath=None, margin=2.5, minSize=160):
+    # archive an already detected session, the crops follow the pupil from its geometry.bin
+    from scripts.others.frameSource import GrayFrameSource
+    records, fps = geometryLog.loadGeometry(os.path.join(sessionFolder, "geometry.bin"))
+    byFrame = {int(f): k for k, f in enumerate(records['frame_id'])}
+    source = GrayFrameSource(videoPath)
+    outputPath = outputPath or os.path.join(sessionFolder, "frames.roi")
+    writer = FrameArchiveWriter(outputPath, fps, source.width, source.height, margin=margin, minSize=minSize)
+    try:
+        for frameIndex, img in source:
+            k = byFrame.get(frameIndex)
+            if k is None and (len(records) == 0 or frameIndex > records['frame_id'][-1]):
+                break  # detection stopped early (quality gate), nothing to archive after it
+            writer.add(frameIndex, img, geometryLog.LoggedPupil(records[k]) if k is not None else None)
+    finally:
+        writer.close()
+    return outputPath
+
+
+if __name__ == "__main__":
+    # python -m scripts.others.frameArchive <video> <session folder>              archive an existing session
+    # python -m scripts.others.frameArchive --detect <archive> [geometry.bin out]  re-detect from an archive
+    if sys.argv[1] == "--detect":
+        records, fps = detectFromArchive(sys.argv[2])
+        geometryLog.saveGeometry(records, sys.argv[3] if len(sys.argv) > 3 else sys.argv[2] + ".geometry.bin", fps)
+    else:
+        archiveVideo(sys.argv[1], sys.argv[2])
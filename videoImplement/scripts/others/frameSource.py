@@ -0,0 +1,93 @@
+# grayscale-only frame source
+# the detector only ever needs the luma plane, so dont decode to BGR, write BMPs and read them back
+# frames are read into ONE preallocated buffer that is reused for every frame
+# -> copy the frame if you need to keep it after the next one is read
+import shutil
+import subprocess
+import cv2
+import numpy as np
+from scripts.others.util import dprint
+
+
+class GrayFrameSource:
+    # start/end: only decode frames [start, end), the seek lands on the keyframe before start and decodes forward
+    def __init__(self, videoPath, backend="auto", start=0, end=None):
+        self.videoPath = videoPath
+        self.start = start
+        self.end = end
+        # read the video properties with opencv, its cheap and doesnt decode anything
+        cap = cv2.VideoCapture(videoPath)
+        if not cap.isOpened():
+            raise IOError(f"Could not open video '{videoPath}'")
+        self.width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = cap.get(cv2.CAP_PROP_FPS)
+        self.frameCount = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+
+        if backend == "auto":
+            backend = "ffmpeg" if shutil.which("ffmpeg") else "opencv"
+        self.backend = backend
+        self.buffer = np.empty((self.height, self.width), dtype=np.uint8)
+        dprint(f"Gray frame source for '{videoPath}': {self.width}x{self.height} @ {self.fps} fps, backend={backend}")
+
+    def __iter__(self):
+        if self.backend == "ffmpeg":
+            return self._ffmpegFrames()
+        return self._opencvFrames()
+
+    def _ffmpegFrames(self):
+        # ffmpeg converts yuv -> gray by just taking the Y plane, no colour maths
+        command = ["ffmpeg", "-v", "error"]
+        if self.start:
+            # -ss before -i seeks to the keyframe and decodes forward, so it is still frame accurate
+            command += ["-ss", f"{self.start / self.fps:.6f}"]
+        command += ["-i", self.videoPath]
+        if self.end is not None:
+            command += ["-frames:v", str(self.end - self.start)]
+        command += ["-f", "rawvideo", "-pix_fmt", "gray", "-"]
+        proc = subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=self.buffer.nbytes)
+        view = memoryview(self.buffer).cast("B")
+        frameIndex = self.start
+        try:
+            while True:
+                filled = 0
+                while filled < len(view):
+                    n = proc.stdout.readinto(view[filled:])
+                    if not n:
+                        break
+                    filled += n
+                if filled < len(view):
+                    break
+                yield frameIndex, self.buffer
+                frameIndex += 1
+        finally:
+            proc.stdout.close()
+            proc.kill()
+            proc.wait()
+
+    def _opencvFrames(self):
+        cap = cv2.VideoCapture(self.videoPath)
+        # ask opencv for the decoder's native frame, for planar yuv the first `height` rows are luma
+        cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+        if self.start:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, self.start)
+        raw = None
+        frameIndex = self.start
+        try:
+            while self.end is None or frameIndex < self.end:
+                ret, raw = cap.read(raw)
+                if not ret:
+                    break
+                if raw.ndim == 2 and raw.shape[0] >= self.height and raw.shape[1] == self.width:
+                    np.copyto(self.buffer, raw[:self.height])
+                elif raw.ndim == 3 and raw.shape[2] == 2:
+                    # packed yuyv, Y is the first channel
+                    np.copyto(self.buffer, raw[:, :, 0])
+                else:
+                    # backend ignored CONVERT_RGB, convert straight into our buffer
+                    cv2.cvtColor(raw, cv2.COLOR_BGR2GRAY, dst=self.buffer)
+                yield frameIndex, self.buffer
+                frameIndex += 1
+        finally:
+            cap.release()
@@ -1,36 +1,178 @@
+import os
+import sys
+import numpy as np
 import matplotlib.pyplot as plt
 import scripts.others.util as util
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 
+# long traces get decimated to about this many points before drawing
+# (a 2 min 90fps recording is ~10k samples, more than the figure has pixels anyway)
+maxPlotPoints = 2000
 
 
-def plotResults(dataframe, savePath=None, showPlot=True, showMm=False, showConfidence=True, title="Pupil Diameter Over Time"):
+def decimateMinMax(x, y, maxPoints=maxPlotPoints):
+    # shape preserving downsampling: split into buckets and keep each bucket's min AND max
+    # so spikes and blinks still show up. NaN-only buckets stay NaN so gaps stay visible
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    buckets = maxPoints // 2
+    if n <= maxPoints or buckets < 1:
+        return x, y
+
+    size = int(np.ceil(n / buckets))
+    padded = buckets * size
+    xs = np.full(padded, np.nan)
+    ys = np.full(padded, np.nan)
+    xs[:n] = x
+    ys[:n] = y
+    xs = xs.reshape(buckets, size)
+    ys = ys.reshape(buckets, size)
+
+    allNan = np.all(np.isnan(ys), axis=1)
+    minIdx = np.argmin(np.where(np.isnan(ys), np.inf, ys), axis=1)
+    maxIdx = np.argmax(np.where(np.isnan(ys), -np.inf, ys), axis=1)
+    # keep the two points in time order inside each bucket
+    first = np.minimum(minIdx, maxIdx)
+    second = np.maximum(minIdx, maxIdx)
+    rows = np.arange(buckets)
+    outIdx = np.stack([first, second], axis=1)
+    outX = xs[rows[:, None], outIdx]
+    outY = ys[rows[:, None], outIdx]
+    outY[allNan] = np.nan
+    # all-NaN buckets still need an x so the line breaks in the right place
+    outX[allNan] = xs[allNan, :1]
+    keep = ~np.isnan(outX[:, 0])
+    return outX[keep].ravel(), outY[keep].ravel()
+
+
+def plotResults(dataframe, savePath=None, showPlot=True, showMm=False, showConfidence=True, title="Pupil Diameter Over Time", maxPoints=None):
     # clear previous plots
     plt.clf()
     # plot data based on dataframe
-    plt.figure("Showing results for " + str(savePath),figsize=(12, 6))
+    fig = plt.figure("Showing results for " + str(savePath),figsize=(12, 6))
+
+    def points(col):
+        if maxPoints:
+            return decimateMinMax(dataframe['timestamp'], dataframe[col], maxPoints)
+        return dataframe['timestamp'], dataframe[col]
+
     plt.subplot(2, 1, 1)
     if showMm:
-        plt.plot(dataframe['timestamp'], dataframe['diameter_mm'], label='Pupil Diameter (mm)', color='blue')
+        plt.plot(*points('diameter_mm'), label='Pupil Diameter (mm)', color='blue')
         plt.ylabel('Diameter (mm)')
     else:
-        plt.plot(dataframe['timestamp'], dataframe['diameter'], label='Pupil Diameter (pixels)', color='blue')
+        plt.plot(*points('diameter'), label='Pupil Diameter (pixels)', color='blue')
         plt.ylabel('Diameter (pixels)')
     plt.xlabel('Time (s)')
     plt.title(title)
     plt.legend()
-    
+
     if showConfidence:
         plt.subplot(2, 1, 2)
-        plt.plot(dataframe['timestamp'], dataframe['confidence'], label='Confidence', color='green')
+        plt.plot(*points('confidence'), label='Confidence', color='green')
         plt.xlabel('Time (s)')
         plt.ylabel('Confidence')
         plt.title('Detection Confidence Over Time')
         plt.legend()
-    
+
     plt.tight_layout()
     if savePath:
         plt.savefig(savePath)
         util.dprint(f"Plot saved to '{savePath}'")
     if showPlot:
         plt.show()
+    else:
+        # nobody is looking at it, dont let figures pile up in long runs
+        plt.close(fig)
+
+
+class BatchPlotter:
+    # one figure + line artists reused for every session, only the data changes between saves
+    # meant for the Agg backend (no window), see renderSessions
+    def __init__(self, maxPoints=maxPlotPoints):
+        self.maxPoints = maxPoints
+        self.fig, (self.axDiameter, self.axConfidence) = plt.subplots(2, 1, figsize=(12, 6))
+        self.diameterLine, = self.axDiameter.plot([], [], color='blue')
+        self.confidenceLine, = self.axConfidence.plot([], [], label='Confidence', color='green')
+        self.axDiameter.set_xlabel('Time (s)')
+        self.axConfidence.set_xlabel('Time (s)')
+        self.axConfidence.set_ylabel('Confidence')
+        self.axConfidence.set_title('Detection Confidence Over Time')
+        self.axConfidence.legend(loc='upper right')
+
+    def render(self, dataframe, savePath, showMm=True, showConfidence=True, title="Pupil Diameter Over Time"):
+        # older sessions only have the pixel diameter, plot that instead
+        showMm = showMm and 'diameter_mm' in dataframe
+        col = 'diameter_mm' if showMm else 'diameter'
+        self.diameterLine.set_data(*decimateMinMax(dataframe['timestamp'], dataframe[col], self.maxPoints))
+        self.diameterLine.set_label('Pupil Diameter (mm)' if showMm else 'Pupil Diameter (pixels)')
+        self.axDiameter.set_ylabel('Diameter (mm)' if showMm else 'Diameter (pixels)')
+        self.axDiameter.set_title(title)
+        self.axDiameter.legend(loc='upper right')
+
+        self.axConfidence.set_visible(showConfidence)
+        if showConfidence:
+            self.confidenceLine.set_data(*decimateMinMax(dataframe['timestamp'], dataframe['confidence'], self.maxPoints))
+
+        for ax in (self.axDiameter, self.axConfidence):
+            ax.relim()
+            ax.autoscale_view()
+        self.fig.tight_layout()
+        self.fig.savefig(savePath)
+        util.dprint(f"Plot saved to '{savePath}'")
+
+
+# one plotter per worker process, made on the first job
+_workerPlotter = None
+
+
+def _initWorker():
+    plt.switch_backend('Agg')
+
+
+def _renderJob(job):
+    # returns (savePath, None) or (savePath, error), one broken session must not stop the whole batch
+    global _workerPlotter
+    csvPath, savePath = job
+    try:
+        if _workerPlotter is None:
+            _workerPlotter = BatchPlotter()
+        _workerPlotter.render(pd.read_csv(csvPath), savePath, showMm=True)
+    except Exception as e:
+        return savePath, f"{type(e).__name__}: {e}"
+    return savePath, None
+
+
+def sessionPlotJobs(dataFolder="data"):
+    # raw.csv -> rawPlot.png, processed.csv -> processedPlot.png for every session folder
+    jobs = []
+    for session in sorted(os.listdir(dataFolder)):
+        sessionPath = os.path.join(dataFolder, session)
+        if not os.path.isdir(sessionPath):
+            continue
+        for csvName, plotName in (("raw.csv", "rawPlot.png"), ("processed.csv", "processedPlot.png")):
+            csvPath = os.path.join(sessionPath, csvName)
+            if os.path.exists(csvPath):
+                jobs.append((csvPath, os.path.join(sessionPath, plotName)))
+    return jobs
+
+
+def renderSessions(dataFolder="data", workers=None):
+    # render every session's plots in a process pool, nothing is shown on screen
+    jobs = sessionPlotJobs(dataFolder)
+    util.dprint(f"Rendering {len(jobs)} plots from '{dataFolder}'")
+    with ProcessPoolExecutor(max_workers=workers, initializer=_initWorker) as pool:
+        results = list(pool.map(_renderJob, jobs))
+    done = [path for path, error in results if error is None]
+    failed = [(path, error) for path, error in results if error is not None]
+    util.dprint(f"Rendered {len(done)} plots")
+    for path, error in failed:
+        util.dprint(f"Failed to render '{path}': {error}")
+    return done
+
+
+if __name__ == "__main__":
+    # python -m scripts.others.graph [dataFolder]
+    renderSessions(sys.argv[1] if len(sys.argv) > 1 else "data")
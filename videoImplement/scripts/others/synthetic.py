@@ -0,0 +1,51 @@
+# synthetic eye frames with a known pupil diameter
+# used as ground truth when benchmarking detectors (we dont have labelled real frames)
+# the diameter follows a rough PLR shape: 3s baseline, constriction after the flash, slow recovery
+import cv2
+import numpy as np
+
+
+def plrDiameterMm(t, baselineMm=6.0, dipMm=4.0, onset=3.0, latency=0.25, constrictionTime=1.0, recoveryTau=8.0):
+    # diameter in mm at time t (seconds)
+    start = onset + latency
+    if t < start:
+        return baselineMm
+    if t < start + constrictionTime:
+        # smooth constriction down to the dip
+        phase = (t - start) / constrictionTime
+        return baselineMm - (baselineMm - dipMm) * 0.5 * (1 - np.cos(np.pi * phase))
+    # exponential recovery back towards baseline (never fully gets there, like PIPR)
+    recovered = 0.8 * (baselineMm - dipMm) * (1 - np.exp(-(t - start - constrictionTime) / recoveryTau))
+    return dipMm + recovered
+
+
+def makeEyeFrame(width, height, center, diameterPx, angle=0.0, axisRatio=0.9, noise=4.0, rng=None):
+    # grey skin, darker iris, black pupil, small white glint
+    frame = np.full((height, width), 150, dtype=np.uint8)
+    cx, cy = int(center[0]), int(center[1])
+    irisRadius = int(diameterPx * 1.8)
+    cv2.circle(frame, (cx, cy), irisRadius, 90, -1, lineType=cv2.LINE_AA)
+    axes = (max(1, int(diameterPx / 2)), max(1, int(diameterPx * axisRatio / 2)))
+    cv2.ellipse(frame, (cx, cy), axes, angle, 0, 360, 20, -1, lineType=cv2.LINE_AA)
+    glintOffset = int(diameterPx * 0.25)
+    cv2.circle(frame, (cx + glintOffset, cy - glintOffset), max(2, int(diameterPx * 0.06)), 250, -1)
+
+    if noise > 0:
+        if rng is None:
+            rng = np.random.default_rng()
+        frame = np.clip(frame + rng.normal(0, noise, frame.shape), 0, 255).astype(np.uint8)
+    return frame
+
+
+def syntheticSession(width, height, fps, seconds, pxToMm=30, seed=0):
+    # yields (frame, true diameter in pixels) for a fake recording
+    # pxToMm is pixels per mm at this resolution
+    rng = np.random.default_rng(seed)
+    totalFrames = int(seconds * fps)
+    cx, cy = width / 2, height / 2
+    for i in range(totalFrames):
+        t = i / fps
+        # slow fixation drift so the pupil isnt glued to one spot
+        center = (cx + 0.02 * width * np.sin(0.3 * t), cy + 0.02 * height * np.cos(0.2 * t))
+        diameterPx = plrDiameterMm(t) * pxToMm
+        yield makeEyeFrame(width, height, center, diameterPx, rng=rng), diameterPx
@@ -1,11 +1,14 @@
 # check for bad trials based on percentage of NaN values
 # if more than threshold percent of data is NaN, mark the whole trial as bad
 import pandas as pd
-from main import dprint, confidenceThresh
+from scripts.others.util import dprint
 
 percentageThreshold = 30.0  # percent
 
 def checkBadTrial(df):
+    # frames skipped on purpose by adaptive sampling are not bad data, leave them out
+    if 'was_skipped' in df.columns:
+        df = df[~df['was_skipped'].astype(bool)]
     totalPoints = len(df)
     badPoints = df['is_bad_data'].sum()
     badPercentage = (badPoints / totalPoints) * 100.0
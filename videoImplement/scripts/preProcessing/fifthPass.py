@@ -1,29 +1,83 @@
-# fifth pass: average the 2 PLR graphs from the same eye of a person
+# fifth pass: average any number of PLR graphs (same eye, repeated trials or a whole cohort)
+# every session is shifted so t=0 is its TPLR start (blue flash), resampled onto one common timebase
+# and stacked into a (sessions x samples) array -> mean / std / count in one go
+# sessions can have different lengths and frame rates (30 and 60 fps trials can be combined)
+import warnings
 import pandas as pd
 import numpy as np
-from main import pxToMm
+import align
+from config import pxToMm
 from scripts.others.util import dprint
+from scripts.preProcessing.resample import resampleOnto
 
-def averagePLRGraphs(df1, df2):
-    dprint("Fifth pass preprocessing: averaging two PLR graphs")
-    if len(df1) != len(df2):
-        dprint("Error: DataFrames have different lengths, cannot average")
+
+def sessionFps(df):
+    # frame rate from the timestamps instead of trusting the folder name
+    return 1.0 / np.median(np.diff(df['timestamp'].values))
+
+
+def findAlignTime(df, fps, startingIndex=0):
+    # timestamp of the TPLR start, same detection as align.py
+    # NaN when there is no valid sample to find a dip in, that session cant be aligned
+    dipIndex = align.lowestDip(df, startingIndex, fps=fps)
+    if dipIndex < 0:
+        dprint("No dip found, session cant be aligned")
+        return float('nan')
+    baselineIndex = align.findBaseline(df, dipIndex, fps=fps)
+    tplrStartIndex = align.findTPLRStart(df, baselineIndex, dipIndex, startIndexBuffer=7, fps=fps)
+    if tplrStartIndex < 0:
+        dprint("TPLR start not found, aligning on the dip instead")
+        tplrStartIndex = dipIndex
+    return df['timestamp'].values[tplrStartIndex]
+
+
+def averagePLRGraphs(*dfs, alignTimes=None, targetFps=None, column='diameter_mm'):
+    # averagePLRGraphs(df1, df2, df3, ...) or averagePLRGraphs(*listOfDfs)
+    # alignTimes: TPLR start time per session, detected if not given
+    # targetFps: rate of the common timebase, defaults to the fastest session
+    dprint(f"Fifth pass preprocessing: averaging {len(dfs)} PLR graphs")
+    if len(dfs) == 0:
+        dprint("Error: no DataFrames to average")
         return None
-    averaged_df = df1.copy()
-    diameters1_mm = df1['diameter_mm'].values
-    diameters2_mm = df2['diameter_mm'].values
-    averaged_diameters_mm = []
-    for i in range(len(diameters1_mm)):
-        d1 = diameters1_mm[i]
-        d2 = diameters2_mm[i]
-        if np.isnan(d1) and np.isnan(d2):
-            averaged_diameters_mm.append(np.nan)
-        elif np.isnan(d1):
-            averaged_diameters_mm.append(d2)
-        elif np.isnan(d2):
-            averaged_diameters_mm.append(d1)
-        else:
-            averaged_diameters_mm.append((d1 + d2) / 2.0)
-    averaged_df['diameter_mm'] = averaged_diameters_mm
-    averaged_df['diameter'] = np.array(averaged_diameters_mm) * pxToMm
-    return averaged_df
\ No newline at end of file
+
+    fpsList = [sessionFps(df) for df in dfs]
+    if alignTimes is None:
+        alignTimes = [findAlignTime(df, fps) for df, fps in zip(dfs, fpsList)]
+    # sessions without an align time would be averaged in at a made up offset, leave them out
+    dropped = [k for k, alignTime in enumerate(alignTimes) if np.isnan(alignTime)]
+    if dropped:
+        dprint(f"Leaving out sessions {dropped} (index in the arguments): no TPLR start/dip to align on")
+        keep = [k for k in range(len(dfs)) if k not in dropped]
+        dfs = [dfs[k] for k in keep]
+        fpsList = [fpsList[k] for k in keep]
+        alignTimes = [alignTimes[k] for k in keep]
+        if len(dfs) == 0:
+            dprint("Error: no session could be aligned")
+            return None
+    if targetFps is None:
+        targetFps = max(fpsList)
+
+    relTimes = [df['timestamp'].values - alignTime for df, alignTime in zip(dfs, alignTimes)]
+    tStart = min(t[0] for t in relTimes)
+    tEnd = max(t[-1] for t in relTimes)
+    # grid goes through t=0 exactly so the TPLR start lands on a sample
+    grid = np.arange(np.floor(tStart * targetFps), np.ceil(tEnd * targetFps) + 1) / targetFps
+
+    stacked = np.vstack([resampleOnto(t, df[column].values.astype(float), grid) for t, df in zip(relTimes, dfs)])
+
+    counts = np.sum(~np.isnan(stacked), axis=0)
+    # nanmean/nanstd warn on samples where every session is NaN, thats expected at the edges
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        mean = np.nanmean(stacked, axis=0)
+        std = np.nanstd(stacked, axis=0)
+
+    averaged_df = pd.DataFrame({
+        'timestamp': grid,
+        'diameter_mm': mean,
+        'diameter': mean * pxToMm,
+        'diameter_mm_std': std,
+        'n_trials': counts,
+    })
+    dprint(f"Averaged onto {len(grid)} samples at {targetFps:.1f} fps, session fps: {[round(f, 1) for f in fpsList]}")
+    return averaged_df
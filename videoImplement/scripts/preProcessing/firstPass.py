@@ -1,11 +1,18 @@
+from config import confidenceThresh  # threshold for confidence filtering
 from scripts.others.util import dprint
 
-confidenceThresh = 0.75  # threshold for confidence filtering
-
-def confidenceFilter(df):
+def confidenceFilter(df, threshold=confidenceThresh):
     # set rows with confidence < 1 to NaN
-    dprint(f"Preprocessing data: setting diameters with confidence < {confidenceThresh} to NaN")
-    df.loc[df['confidence'] < confidenceThresh, 'diameter'] = float('nan')
+    dprint(f"Preprocessing data: setting diameters with confidence < {threshold} to NaN")
+    df.loc[df['confidence'] < threshold, 'diameter'] = float('nan')
     # do the same for diameter_mm
-    df.loc[df['confidence'] < confidenceThresh, 'diameter_mm'] = float('nan')
+    df.loc[df['confidence'] < threshold, 'diameter_mm'] = float('nan')
+    # detections the kalman tracker rejected during detection
+    if 'kalman_rejected' in df.columns:
+        dprint(f"Preprocessing data: setting {df['kalman_rejected'].sum()} kalman-rejected diameters to NaN")
+        df.loc[df['kalman_rejected'], ['diameter', 'diameter_mm']] = float('nan')
+    # raw.csv flagged bad data with config.confidenceThresh, redo it for this threshold (same rule as saveDataToCSV)
+    df['is_bad_data'] = (df['confidence'] < threshold) | df['confidence'].isna()
+    if 'kalman_rejected' in df.columns:
+        df['is_bad_data'] = df['is_bad_data'] | df['kalman_rejected']
     return df
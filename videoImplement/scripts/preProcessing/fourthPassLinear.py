@@ -1,6 +1,5 @@
 import pandas as pd
 import numpy as np
-from scipy.interpolate import CubicSpline, interp1d
 from scripts.others.util import dprint
 
 def linear_interpolation(df: pd.DataFrame, fps=60, max_gap_ms=400): #max 500ms
@@ -88,13 +87,15 @@ def linear_interpolation(df: pd.DataFrame, fps=60, max_gap_ms=400): #max 500ms
 
     return df_interp
 
-def interpolateData(df):
+def interpolateData(df, fps=60, max_gap_ms=400):
     """
     Interpolate NaN values in diameter and diameter_mm columns 
     using cubic spline interpolation.
     
     Args:
         df: DataFrame with 'diameter' and 'diameter_mm' columns
+        fps: frame rate of the data, sets how many frames max_gap_ms is
+        max_gap_ms: longest gap that gets filled
     
     Returns:
         DataFrame with interpolated values
@@ -110,8 +111,8 @@ def interpolateData(df):
     #print("\nProcessing 'diameter_mm' column:")
     #df_interpolated['diameter_mm'] = interpolate_column_cubic_only(df['diameter_mm'], 'diameter_mm')
 
-    dprint("Interpolating NaN values using linear interpolation (max gap 400ms)...")
-    df_interpolated = linear_interpolation(df, fps=60, max_gap_ms=400)
+    dprint(f"Interpolating NaN values using linear interpolation (max gap {max_gap_ms}ms, {fps} fps)...")
+    df_interpolated = linear_interpolation(df, fps=fps, max_gap_ms=max_gap_ms)
     dprint("Interpolation completed.")    
     return df_interpolated
 
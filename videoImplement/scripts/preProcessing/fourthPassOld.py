@@ -3,7 +3,9 @@
 import pandas as pd
 import numpy as np
 from scipy.interpolate import CubicSpline
-from main import dprint, pxToMm
+from config import pxToMm
+from scripts.others.util import dprint
+from scripts.preProcessing.rollingStats import SlidingWindow
 
 # seconds per frame = 1 / fps
 
@@ -19,21 +21,21 @@ def interpolateData(df, fps=60):
     
     # calculate local median for outlier detection
     # use a sliding window to get robust baseline
-    def is_outlier(value, idx, window_size=int(fps)):
+    # the window slides along with the gap walk instead of two np.median over it per check,
+    # filled values are written through it so later checks see them like before
+    window = SlidingWindow(diameters, int(fps), int(fps) - 1)
+
+    def is_outlier(value, idx):
         """Check if value is an outlier compared to local context"""
         if np.isnan(value):
             return True
-        # get context window around the point
-        start_idx = max(0, idx - window_size)
-        end_idx = min(n, idx + window_size)
-        context_values = diameters[start_idx:end_idx]
-        valid_values = context_values[~np.isnan(context_values)]
-        
-        if len(valid_values) < 5:
+        # get context window around the point [idx - fps, idx + fps)
+        stats = window.at(idx)
+        if len(stats) < 5:
             return False  # not enough data to judge
         
-        median = np.median(valid_values)
-        mad = np.median(np.abs(valid_values - median))  # median absolute deviation
+        median = stats.median()
+        mad = stats.mad(median)  # median absolute deviation
         
         # use MAD-based threshold (more robust than std)
         # 3 * MAD threshold is roughly equivalent to 3 std deviations
@@ -69,7 +71,7 @@ def interpolateData(df, fps=60):
                     if not np.isnan(y0) and not np.isnan(y1) and not is_outlier(y0, x0) and not is_outlier(y1, x1):
                         for j in range(start, end + 1):
                             # linear interpolation formula
-                            diameters[j] = y0 + (y1 - y0) * (j - x0) / (x1 - x0)
+                            window.set(j, y0 + (y1 - y0) * (j - x0) / (x1 - x0))
                     else:
                         dprint(f"Skipping interpolation: boundary points invalid (y0={y0}, y1={y1})")
             elif gapSize <= maxCubicGap:
@@ -90,7 +92,7 @@ def interpolateData(df, fps=60):
                 if len(x_points) >= 4:
                     cs = CubicSpline(x_points, y_points)
                     for j in range(start, end + 1):
-                        diameters[j] = cs(j)
+                        window.set(j, float(cs(j)))
                 else:
                     dprint(f"Skipping cubic spline: insufficient valid boundary points ({len(x_points)} < 4)")
         else:
@@ -1,11 +1,12 @@
 import pandas as pd
 import numpy as np
-from scipy.interpolate import CubicSpline
+from scripts.preProcessing.splineFill import batchedGapFill
 
 def interpolate_column_cubic_only(data, column_name):
     """
     Interpolate NaN values in a column using cubic spline interpolation 
     with 4 nearest neighbors (2 before, 2 after the gap).
+    All gaps are filled together, see splineFill.batchedGapFill.
     
     Args:
         data: pandas Series with NaN values
@@ -14,62 +15,9 @@ def interpolate_column_cubic_only(data, column_name):
     Returns:
         interpolated pandas Series
     """
-    values = data.copy()
-    n = len(values)
-    i = 0
-    
-    while i < n:
-        if np.isnan(values[i]):
-            # Found start of a NaN gap
-            start = i
-            
-            # Find end of the gap
-            while i < n and np.isnan(values[i]):
-                i += 1
-            end = i - 1
-            gapSize = end - start + 1
-            
-            # Collect 4 valid points (expand search if needed)
-            x_points = []
-            y_points = []
-            
-            # Find 2 valid points before the gap
-            before_count = 0
-            k = start - 1
-            while before_count < 2 and k >= 0:
-                if not np.isnan(values[k]):
-                    x_points.append(k)
-                    y_points.append(values[k])
-                    before_count += 1
-                k -= 1
-            
-            # Find 2 valid points after the gap
-            after_count = 0
-            k = end + 1
-            while after_count < 2 and k < n:
-                if not np.isnan(values[k]):
-                    x_points.append(k)
-                    y_points.append(values[k])
-                    after_count += 1
-                k += 1
-            
-            # Only interpolate if we have 4 valid boundary points
-            if len(x_points) >= 4:
-                # Sort points by x index to ensure strictly increasing order
-                sorted_pairs = sorted(zip(x_points, y_points))
-                x_points = [p[0] for p in sorted_pairs]
-                y_points = [p[1] for p in sorted_pairs]
-                
-                cs = CubicSpline(x_points, y_points)
-                for j in range(start, end + 1):
-                    values[j] = cs(j)
-                print(f"  {column_name} - Frames {start} to {end}: cubic spline interpolation (gap size: {gapSize}, neighbors at: {x_points})")
-            else:
-                print(f"  {column_name} - Frames {start} to {end}: skipped (insufficient neighbors: {len(x_points)} < 4)")
-        else:
-            i += 1
-    
-    return values
+    filled, counts = batchedGapFill(data.values, anchors="nearest")
+    print(f"  {column_name}: cubic spline interpolation on {counts['cubic']} gaps, skipped {counts['skipped']} (insufficient neighbors)")
+    return pd.Series(filled, index=data.index, name=data.name)
 
 
 def interpolateData(df):
@@ -0,0 +1,146 @@
+# resample pupil traces between frame rates (our sessions are 30, 60 or 90 fps)
+# so every pass and metric can run on one canonical rate and sessions can be compared directly
+# - anti-aliased polyphase FIR (scipy resample_poly), so going 90 -> 60 doesnt alias
+# - NaN/gap aware: gaps are bridged only to run the filter, then masked out again in the output
+# - batched: many traces at the same source rate go through the filter as one 2-D array
+# - per-frame flags (closed_eye from the blink gate) are carried over: an output sample is flagged if any input
+#   frame in its time window is, so a one frame blink is not lost when going down in rate
+from fractions import Fraction
+import numpy as np
+import pandas as pd
+from scripts.others.util import dprint
+
+
+def ratio(sourceFps, targetFps):
+    # up/down factors, e.g. 90 -> 60 = 2/3
+    frac = Fraction(float(targetFps) / float(sourceFps)).limit_denominator(1000)
+    return frac.numerator, frac.denominator
+
+
+def resampleOnto(times, values, grid):
+    # linear interpolation onto grid, NaN outside the trace or next to a NaN sample
+    # (so gaps stay gaps instead of being bridged)
+    left = np.searchsorted(times, grid, side='right') - 1
+    inside = (left >= 0) & (grid <= times[-1])
+    left = np.clip(left, 0, len(times) - 2)
+    t0, t1 = times[left], times[left + 1]
+    v0, v1 = values[left], values[left + 1]
+    w = (grid - t0) / (t1 - t0)
+    out = v0 + (v1 - v0) * w
+    # grid points that land exactly on a sample keep it even if the neighbour is NaN
+    out = np.where(w < 1e-6, v0, np.where(w > 1 - 1e-6, v1, out))
+    out[~inside] = np.nan
+    return out
+
+
+def fillGaps(traces):
+    # linear fill of NaNs along each row, all rows at once
+    # edges are held at the nearest valid value, rows with no data become 0
+    valid = ~np.isnan(traces)
+    n = traces.shape[1]
+    positions = np.broadcast_to(np.arange(n), traces.shape)
+    prevIdx = np.maximum.accumulate(np.where(valid, positions, -1), axis=1)
+    nextIdx = np.minimum.accumulate(np.where(valid, positions, n)[:, ::-1], axis=1)[:, ::-1]
+
+    hasPrev = prevIdx >= 0
+    hasNext = nextIdx < n
+    prevSafe = np.where(hasPrev, prevIdx, np.where(hasNext, nextIdx, 0))
+    nextSafe = np.where(hasNext, nextIdx, prevSafe)
+    prevVal = np.take_along_axis(np.nan_to_num(traces), prevSafe, axis=1)
+    nextVal = np.take_along_axis(np.nan_to_num(traces), nextSafe, axis=1)
+
+    span = nextSafe - prevSafe
+    w = np.where(span > 0, (positions - prevSafe) / np.where(span > 0, span, 1), 0.0)
+    filled = prevVal + (nextVal - prevVal) * w
+    return np.where(valid, traces, filled)
+
+
+def resampleBatch(traces, sourceFps, targetFps):
+    # traces: list of 1-D arrays (can be different lengths) all recorded at sourceFps
+    # returns a list of 1-D arrays at targetFps, NaN where the input had gaps
+    up, down = ratio(sourceFps, targetFps)
+    lengths = [len(t) for t in traces]
+    width = max(lengths)
+    stacked = np.full((len(traces), width), np.nan)
+    for row, trace in enumerate(traces):
+        stacked[row, :len(trace)] = trace
+    gapMask = np.isnan(stacked)
+
+    if up == down:
+        return [stacked[row, :length].copy() for row, length in enumerate(lengths)]
+
+    # imported here, scipy.signal is slow to import and same-rate sessions never get this far
+    from scipy.signal import resample_poly
+    out = resample_poly(fillGaps(stacked), up, down, axis=1, padtype='line')
+
+    # output sample k sits at input position k*down/up, NaN if either input neighbour was NaN
+    position = np.arange(out.shape[1]) * down / up
+    lo = np.clip(np.floor(position).astype(int), 0, width - 1)
+    hi = np.clip(np.ceil(position).astype(int), 0, width - 1)
+    out[gapMask[:, lo] | gapMask[:, hi]] = np.nan
+
+    return [out[row, :int(np.ceil(length * up / down))] for row, length in enumerate(lengths)]
+
+
+def resampleTrace(values, sourceFps, targetFps, timestamps=None):
+    # single trace version, timestamps are only needed if the frames were not evenly spaced
+    values = np.asarray(values, dtype=float)
+    if timestamps is not None:
+        values = toUniform(timestamps, values, sourceFps)
+    return resampleBatch([values], sourceFps, targetFps)[0]
+
+
+def toUniform(timestamps, values, fps):
+    # put a jittery trace (dropped/duplicated frames) onto an exact 1/fps grid first
+    timestamps = np.asarray(timestamps, dtype=float)
+    steps = np.diff(timestamps) * fps
+    if np.all(np.abs(steps - 1) < 0.01):
+        # already evenly spaced, nothing to do
+        return np.asarray(values, dtype=float)
+    grid = timestamps[0] + np.arange(int(round((timestamps[-1] - timestamps[0]) * fps)) + 1) / fps
+    return resampleOnto(timestamps, np.asarray(values, dtype=float), grid)
+
+
+def resampleFlags(flags, sourceFps, targetFps, length):
+    # output sample k covers input positions k*step +- step/2 (and always its two nearest input frames)
+    flags = np.asarray(flags, dtype=bool)
+    step = float(sourceFps) / float(targetFps)
+    centre = np.arange(length) * step
+    lo = np.minimum(np.ceil(centre - step / 2), np.floor(centre)).astype(int)
+    hi = np.maximum(np.floor(centre + step / 2), np.ceil(centre)).astype(int) + 1
+    lo = np.clip(lo, 0, len(flags))
+    hi = np.clip(hi, 0, len(flags))
+    counts = np.concatenate(([0], np.cumsum(flags)))
+    return counts[hi] - counts[lo] > 0
+
+
+def resampleSessions(dfs, targetFps):
+    # batch version for many sessions: sessions with the same rate share one filter call per column
+    fpsList = [round(float(1.0 / np.median(np.diff(df['timestamp'].values))), 2) for df in dfs]
+    results = [None] * len(dfs)
+    for fps in sorted(set(fpsList)):
+        group = [i for i, f in enumerate(fpsList) if f == fps]
+        columns = [col for col in ['diameter', 'diameter_mm', 'confidence'] if all(col in dfs[i].columns for i in group)]
+        flagColumns = [col for col in ['closed_eye'] if all(col in dfs[i].columns for i in group)]
+        perColumn = {}
+        for col in columns:
+            uniform = [toUniform(dfs[i]['timestamp'].values, dfs[i][col].values, fps) for i in group]
+            perColumn[col] = resampleBatch(uniform, fps, targetFps)
+        for k, i in enumerate(group):
+            n = len(perColumn[columns[0]][k])
+            out = pd.DataFrame({'frame_id': np.arange(n), 'timestamp': dfs[i]['timestamp'].values[0] + np.arange(n) / targetFps})
+            for col in columns:
+                out[col] = perColumn[col][k]
+            out['is_bad_data'] = np.isnan(out['diameter_mm'].values)
+            for col in flagColumns:
+                # jittery timestamps: a uniform frame touching a flagged one counts as flagged
+                flags = toUniform(dfs[i]['timestamp'].values, dfs[i][col].fillna(False).values.astype(float), fps) > 0
+                out[col] = resampleFlags(flags, fps, targetFps, n)
+            results[i] = out
+    dprint(f"Resampled {len(dfs)} sessions ({sorted(set(fpsList))} fps) to {targetFps} fps")
+    return results
+
+
+def resampleDataFrame(df, targetFps):
+    # resample one raw/processed dataframe to targetFps, keeps the diameter/confidence columns and closed_eye
+    return resampleSessions([df], targetFps)[0]
@@ -0,0 +1,152 @@
+# rolling median / MAD / quantiles over fps-scale windows
+# the outlier and baseline code used to take np.median (and a second one for the MAD) of the whole window
+# for every sample, that is O(w log w) per step and gets slow with 2*fps windows at 90-120 fps
+# here the window is kept sorted while it slides:
+#   - one insert and one delete per step, both found with bisect (O(log w) comparisons, the shift is
+#     one memmove of the list, faster than walking a pure python skiplist at these window sizes)
+#   - median / quantiles are direct lookups
+#   - the MAD is the k-th smallest distance to the median, the distances on each side of the median are
+#     already sorted so its a k-th-of-two-sorted-lists search, O(log w)
+# NaNs take a slot in the window but are never inserted, so every statistic skips them like np.nanmedian
+import bisect
+import math
+import numpy as np
+
+
+class RollingOrderStats:
+    def __init__(self):
+        self.values = []  # sorted, NaN free
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, value):
+        if not math.isnan(value):
+            bisect.insort(self.values, value)
+
+    def discard(self, value):
+        if not math.isnan(value):
+            del self.values[bisect.bisect_left(self.values, value)]
+
+    def quantile(self, q):
+        # linear interpolation between the closest ranks, same as np.quantile's default
+        if not self.values:
+            return float('nan')
+        pos = q * (len(self.values) - 1)
+        low = int(pos)
+        high = min(low + 1, len(self.values) - 1)
+        return self.values[low] + (self.values[high] - self.values[low]) * (pos - low)
+
+    def median(self):
+        if not self.values:
+            return float('nan')
+        m = len(self.values)
+        return (self.values[(m - 1) // 2] + self.values[m // 2]) / 2
+
+    def mad(self, median=None):
+        # median absolute deviation from the median (unscaled, multiply by 1.4826 for a std estimate)
+        if not self.values:
+            return float('nan')
+        s = self.values
+        m = len(s)
+        if median is None:
+            median = self.median()
+        # s[:split] <= median <= s[split:], distances grow outwards on both sides
+        split = (m + 1) // 2
+        left = lambda t: median - s[split - 1 - t]
+        right = lambda t: s[split + t] - median
+        return (self.kthDistance(left, split, right, m - split, (m - 1) // 2)
+                + self.kthDistance(left, split, right, m - split, m // 2)) / 2
+
+    @staticmethod
+    def kthDistance(a, lenA, b, lenB, k):
+        # k-th smallest (0 based) of two sorted sequences given as accessors, binary search on how many come from a
+        low, high = max(0, k + 1 - lenB), min(k + 1, lenA)
+        while low < high:
+            fromA = (low + high) // 2
+            if a(fromA) < b(k - fromA):
+                low = fromA + 1
+            else:
+                high = fromA
+        fromA = low
+        candidates = []
+        if fromA > 0:
+            candidates.append(a(fromA - 1))
+        if k - fromA >= 0:
+            candidates.append(b(k - fromA))
+        return max(candidates)
+
+
+class SlidingWindow:
+    # window over an array the caller still changes while walking through it (e.g. filling gaps as it goes)
+    # at(i) moves the window to [i - before, i + after], set(j, value) writes through and keeps the window in sync
+    def __init__(self, values, before, after):
+        self.values = values
+        self.before = before
+        self.after = after
+        self.stats = RollingOrderStats()
+        self.low = 0
+        self.high = 0  # current window is values[low:high]
+
+    def at(self, i):
+        low, high = max(0, i - self.before), min(len(self.values), i + self.after + 1)
+        if low >= self.high or high <= self.low:
+            self.stats = RollingOrderStats()
+            self.low = self.high = low
+        while self.low < low:
+            self.stats.discard(self.values[self.low])
+            self.low += 1
+        while self.low > low:
+            self.low -= 1
+            self.stats.add(self.values[self.low])
+        while self.high < high:
+            self.stats.add(self.values[self.high])
+            self.high += 1
+        while self.high > high:
+            self.high -= 1
+            self.stats.discard(self.values[self.high])
+        return self.stats
+
+    def set(self, j, value):
+        if self.low <= j < self.high:
+            self.stats.discard(self.values[j])
+            self.stats.add(value)
+        self.values[j] = value
+
+
+def slidingWindows(values, before, after):
+    # yields (i, stats) with stats holding values[i - before : i + after + 1]
+    values = np.asarray(values, dtype=float).tolist()
+    n = len(values)
+    stats = RollingOrderStats()
+    for j in range(min(after, n)):
+        stats.add(values[j])
+    for i in range(n):
+        if i + after < n:
+            stats.add(values[i + after])
+        if i - before - 1 >= 0:
+            stats.discard(values[i - before - 1])
+        yield i, stats
+
+
+def rollingMedianMad(values, before, after=None, minPeriods=1):
+    # rolling median and MAD, window is [i - before, i + after] (after defaults to before, i.e. centered)
+    # windows with fewer than minPeriods valid values give NaN
+    after = before if after is None else after
+    n = len(values)
+    medians = np.full(n, np.nan)
+    mads = np.full(n, np.nan)
+    for i, stats in slidingWindows(values, before, after):
+        if len(stats) >= max(1, minPeriods):
+            medians[i] = stats.median()
+            mads[i] = stats.mad(medians[i])
+    return medians, mads
+
+
+def rollingQuantile(values, q, before, after=None, minPeriods=1):
+    after = before if after is None else after
+    out = np.full(len(values), np.nan)
+    for i, stats in slidingWindows(values, before, after):
+        if len(stats) >= max(1, minPeriods):
+            out[i] = stats.quantile(q)
+    return out
@@ -5,14 +5,28 @@
 # if difference between frame n and frame n+1 is too large, set frame n+1 to NaN
 
 # also check and remove if pupil diameter is above 9mm and below 2mm
+# blinks end up in an is_blink column: frames the detection blink gate called closed-eye (closed_eye column)
+# plus blinkPaddingMs either side (lid half over the pupil), and the v-shaped blinks found below
 import pandas as pd
 import numpy as np
-from main import confidenceThresh
+from config import confidenceThresh
 from scripts.others.util import dprint
 
+blinkPaddingMs = 50
+
 def removeSusBio(df, fps):
     dprint("Second pass preprocessing: removing biologically implausible changes")
 
+    df['is_blink'] = False
+    if 'closed_eye' in df.columns:
+        closed = df['closed_eye'].fillna(False).values.astype(bool)
+        padding = int(blinkPaddingMs / 1000.0 * fps)
+        blink = np.convolve(closed.astype(int), np.ones(2 * padding + 1, dtype=int), mode='same') > 0
+        dprint(f"{closed.sum()} closed-eye frames from detection, {blink.sum()} marked as blink with {padding} frames padding")
+        df['is_blink'] = blink
+        df.loc[blink, ['diameter', 'diameter_mm']] = np.nan
+        df.loc[blink, 'is_bad_data'] = True
+
     # remove based on absolute diameter limits
     diameters = df['diameter_mm'].values
     pixelsDiameters = df['diameter'].values
@@ -95,6 +109,7 @@ def removeSusBio(df, fps):
                                     diameters[k] = np.nan
                                     pixelsDiameters[k] = np.nan
                                     df.at[k, 'is_bad_data'] = True
+                                    df.at[k, 'is_blink'] = True
 
                                 i = blink_end + 1 #skip past the blink
                                 continue
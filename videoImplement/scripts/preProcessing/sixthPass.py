@@ -3,8 +3,8 @@
 
 import numpy as np
 import pandas as pd
+from functools import lru_cache
 from scripts.others.util import dprint
-from scipy.signal import savgol_filter
 
 """
 def rollingAverage(dataframe):
@@ -36,24 +36,26 @@ def rollingAverage(dataframe):
 """
 
 
-def savgolSmoothing(dataframe, fps=60, target_window_ms=150): 
+# savgol smoothing engine
+# - filter coefficients are computed once per (window, polyorder) and cached
+# - every valid (non-NaN) segment is smoothed on its own, gaps are never filled just to run the filter
+# - works on a 2-D batch (one trace per row) in one go, so a whole cohort is one call
+# near the edge of a segment the window is shifted inside the segment and the polynomial is evaluated
+# off-centre, which is what savgol_filter(mode='interp') does at the ends of the array
 
-    n_points = len(dataframe)
-    diameters = dataframe['diameter'].values.copy()
-    diameters_mm = dataframe['diameter_mm'].values.copy()
 
-    #handle nan bc savgol cant (safety feature, all nan shld alr be taken care of during the 4th pass)
-    if np.any(np.isnan(diameters)):
-        diameters = pd.Series(diameters).interpolate(method = 'linear', limit_direction = 'both').values
-    if np.any(np.isnan(diameters_mm)):
-        diameters_mm = pd.Series(diameters_mm).interpolate(method = 'linear', limit_direction = 'both').values
+@lru_cache(maxsize=None)
+def savgolMatrix(window, polyorder):
+    # row p = coefficients that evaluate the fitted polynomial at position p of the window
+    # the middle row is the normal smoothing kernel
+    # scipy.signal is slow to import and this only runs once per window size (cached)
+    from scipy.signal import savgol_coeffs
+    return np.array([savgol_coeffs(window, polyorder, pos=p, use='dot') for p in range(window)])
 
-    #calc signal properties
-    signal_std = np.std(diameters_mm)
-    signal_range = np.max(diameters_mm) - np.min(diameters_mm)
 
-    #adaptive window size based on fps and signal properties
-    target_window_ms = target_window_ms
+@lru_cache(maxsize=None)
+def savgolParams(fps, target_window_ms, noisy):
+    # window length (odd, in frames) and polyorder for this frame rate
     window_frames = int(target_window_ms / (1000 / fps))
 
     #window size must be odd
@@ -61,37 +63,120 @@ def savgolSmoothing(dataframe, fps=60, target_window_ms=150):
         window_frames += 1
 
     #adjust based on signal quality
-    if signal_std > 0.5: #noisy bad
+    if noisy: #noisy bad
         window_frames = min(window_frames + 2, 11) #larger window -> more smoothing
         polyorder = 2 #lower order (2 = quadratic) to prevent overfitting bad data
-        dprint(f"Noisy signal, using window = {window_frames}, polyorder/power of the curve = {polyorder}")
     else: #clean signal good
         window_frames = max(5, window_frames) #smaller window -> better preserve peaks and troughs
         polyorder = 3 #cubic
-        dprint(f"Clean signal, using window = {window_frames}, polyorder/power of the curve = {polyorder}")
-
-    if window_frames > n_points:
-        window_frames = n_points if n_points % 2 == 1 else n_points - 1
-        window_frames = max(3, window_frames)
 
     if window_frames < 5:
         window_frames = 5
 
     if polyorder >= window_frames:
         polyorder = window_frames - 1
+    return window_frames, polyorder
+
+
+def segmentBounds(valid):
+    # for every sample: index of the first and last sample of the valid run it belongs to
+    n = valid.shape[1]
+    positions = np.broadcast_to(np.arange(n), valid.shape)
+    prevValid = np.zeros_like(valid)
+    prevValid[:, 1:] = valid[:, :-1]
+    nextValid = np.zeros_like(valid)
+    nextValid[:, :-1] = valid[:, 1:]
+    isStart = valid & ~prevValid
+    isEnd = valid & ~nextValid
+    start = np.maximum.accumulate(np.where(isStart, positions, 0), axis=1)
+    end = np.minimum.accumulate(np.where(isEnd, positions, n - 1)[:, ::-1], axis=1)[:, ::-1]
+    return start, end
+
+
+def smoothBatch(traces, window, polyorder):
+    # traces: 2-D array, one trace per row, NaN = gap
+    traces = np.atleast_2d(np.asarray(traces, dtype=float))
+    out = traces.copy()
+    valid = ~np.isnan(traces)
+    if not valid.any():
+        return out
+    start, end = segmentBounds(valid)
+    length = end - start + 1
+    half = window // 2
+
+    # all samples in segments at least one window long, gathered and filtered together
+    rows, cols = np.nonzero(valid & (length >= window))
+    if len(rows):
+        windowStart = np.clip(cols - half, start[rows, cols], end[rows, cols] - window + 1)
+        pos = cols - windowStart
+        gathered = traces[rows[:, None], windowStart[:, None] + np.arange(window)]
+        out[rows, cols] = np.einsum('ij,ij->i', gathered, savgolMatrix(window, polyorder)[pos])
+
+    # short segments get the biggest odd window that fits, or are left alone if even that is too small
+    isSegmentStart = start == np.arange(traces.shape[1])
+    rows, cols = np.nonzero(valid & (length < window) & isSegmentStart)
+    for row, col in zip(rows, cols):
+        segLength = length[row, col]
+        shortWindow = segLength if segLength % 2 == 1 else segLength - 1
+        if shortWindow <= polyorder:
+            continue
+        segment = traces[row, col:col + segLength]
+        M = savgolMatrix(shortWindow, polyorder)
+        shortHalf = shortWindow // 2
+        for k in range(segLength):
+            ws = min(max(k - shortHalf, 0), segLength - shortWindow)
+            out[row, col + k] = M[k - ws] @ segment[ws:ws + shortWindow]
+    return out
 
-    dprint(f"Adaptive parameters: window = {window_frames}, polyorder = {polyorder}")
 
-    #apply smoothing using the library
-    smoothed = savgol_filter(diameters, window_length = window_frames, polyorder = polyorder, mode = 'interp')
-    smoothed_mm = savgol_filter(diameters_mm, window_length = window_frames, polyorder = polyorder, mode = 'interp')
+def savgolSmoothing(dataframe, fps=60, target_window_ms=150): 
+
+    n_points = len(dataframe)
+    diameters = dataframe['diameter'].values.astype(float)
+    diameters_mm = dataframe['diameter_mm'].values.astype(float)
+
+    #calc signal properties (NaNs are gaps, dont fill them just for this)
+    signal_std = np.nanstd(diameters_mm)
 
-    nan_mask = np.isnan(diameters)
-    smoothed[nan_mask] = np.nan
-    smoothed_mm[nan_mask] = np.nan
+    #adaptive window size based on fps and signal properties
+    window_frames, polyorder = savgolParams(fps, target_window_ms, bool(signal_std > 0.5))
+    if signal_std > 0.5:
+        dprint(f"Noisy signal, using window = {window_frames}, polyorder/power of the curve = {polyorder}")
+    else:
+        dprint(f"Clean signal, using window = {window_frames}, polyorder/power of the curve = {polyorder}")
+
+    if window_frames > n_points:
+        window_frames = n_points if n_points % 2 == 1 else n_points - 1
+        window_frames = max(3, window_frames)
+        polyorder = min(polyorder, window_frames - 1)
+
+    dprint(f"Adaptive parameters: window = {window_frames}, polyorder = {polyorder}")
+
+    #both columns in one call, each valid segment smoothed on its own
+    smoothed, smoothed_mm = smoothBatch(np.vstack([diameters, diameters_mm]), window_frames, polyorder)
 
     dataframe['diameter'] = smoothed
     dataframe['diameter_mm'] = smoothed_mm
 
     return dataframe
-    
+
+
+def savgolSmoothingBatch(dataframes, fps=60, target_window_ms=150):
+    # same as savgolSmoothing but for many sessions at the same fps
+    # sessions that end up with the same window/polyorder go through smoothBatch together
+    groups = {}
+    for k, df in enumerate(dataframes):
+        params = savgolParams(fps, target_window_ms, bool(np.nanstd(df['diameter_mm'].values) > 0.5))
+        groups.setdefault(params, []).append(k)
+
+    for (window_frames, polyorder), members in groups.items():
+        width = max(len(dataframes[k]) for k in members)
+        for col in ['diameter', 'diameter_mm']:
+            stacked = np.full((len(members), width), np.nan)
+            for row, k in enumerate(members):
+                stacked[row, :len(dataframes[k])] = dataframes[k][col].values
+            smoothed = smoothBatch(stacked, window_frames, polyorder)
+            for row, k in enumerate(members):
+                dataframes[k][col] = smoothed[row, :len(dataframes[k])]
+    dprint(f"Smoothed {len(dataframes)} sessions in {len(groups)} batch(es)")
+    return dataframes
@@ -0,0 +1,126 @@
+# batched gap filling for the fourth pass (fpco / fourthPassNoBoundaryCheck)
+# the old code walked every NaN gap in python, built a CubicSpline per gap and evaluated it one frame at a time
+# here all gaps are handled with array indexing:
+#   - gaps are found with one diff over the NaN mask
+#   - linear gaps are filled in one go from their two neighbours
+#   - cubic gaps gather their 4 anchor points for all gaps at once, a CubicSpline through 4 points
+#     (not-a-knot) is just the cubic polynomial through them, so every gap is one 4x4 solve and
+#     np.linalg.solve does all of them together
+# gaps are filled left to right in the old code, so a gap can use the filled values of the gap before it
+# as anchors when only one valid sample separates them. those gaps wait for the next round, and each round
+# only touches its own gaps (anchors come from the gap's neighbourhood, not from a rescan of the whole array)
+import numpy as np
+
+
+def findGaps(values):
+    # start and end index (inclusive) of every NaN run
+    isNan = np.isnan(values)
+    edges = np.diff(np.concatenate(([0], isNan.view(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    return starts, ends
+
+
+def cubicThroughFour(xAnchors, yAnchors, starts, sizes):
+    # xAnchors/yAnchors: (gaps, 4), returns the values of every gap's cubic at its own frames, gaps concatenated
+    # x is shifted to the gap start so the vandermonde systems stay well conditioned
+    x = (xAnchors - starts[:, None]).astype(float)
+    vander = x[:, :, None] ** np.arange(4)
+    coef = np.linalg.solve(vander, yAnchors[:, :, None])[:, :, 0]
+
+    gapOf = np.repeat(np.arange(len(starts)), sizes)
+    offsets = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    t = (np.arange(sizes.sum()) - offsets[gapOf]).astype(float)
+    c = coef[gapOf]
+    return ((c[:, 3] * t + c[:, 2]) * t + c[:, 1]) * t + c[:, 0]
+
+
+def fillRanges(out, starts, sizes, filled):
+    gapOf = np.repeat(np.arange(len(starts)), sizes)
+    offsets = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    out[starts[gapOf] + np.arange(sizes.sum()) - offsets[gapOf]] = filled
+
+
+def batchedGapFill(values, maxLinearGap=0, maxCubicGap=None, anchors="nearest"):
+    # gaps up to maxLinearGap frames: linear between the two neighbours
+    # gaps up to maxCubicGap frames (None = any size): cubic through 4 anchor points
+    #   anchors="nearest":  the 2 closest valid points on each side, skipping NaNs (fpco)
+    #   anchors="adjacent": exactly the 2 frames on each side, all 4 must be valid (fourthPassNoBoundaryCheck)
+    # gaps without enough anchors and longer gaps stay NaN
+    # returns (filled copy, {'linear': n, 'cubic': n, 'skipped': n})
+    original = np.asarray(values, dtype=float)
+    out = original.copy()
+    n = len(out)
+    starts, ends = findGaps(original)
+    sizes = ends - starts + 1
+    counts = {'linear': 0, 'cubic': 0, 'skipped': 0}
+    if len(starts) == 0:
+        return out, counts
+
+    linear = sizes <= maxLinearGap
+    cubic = ~linear if maxCubicGap is None else ~linear & (sizes <= maxCubicGap)
+
+    # linear gaps only need their direct neighbours, which are never NaN
+    lin = linear & (starts > 0) & (ends < n - 1)
+    if lin.any():
+        x0, x1 = starts[lin] - 1, ends[lin] + 1
+        gapOf = np.repeat(np.arange(lin.sum()), sizes[lin])
+        offsets = np.concatenate(([0], np.cumsum(sizes[lin])[:-1]))
+        j = starts[lin][gapOf] + np.arange(sizes[lin].sum()) - offsets[gapOf]
+        w = (j - x0[gapOf]) / (x1[gapOf] - x0[gapOf])
+        out[j] = original[x0[gapOf]] + (original[x1[gapOf]] - original[x0[gapOf]]) * w
+    counts['linear'] = int(lin.sum())
+    counts['skipped'] += int((linear & ~lin).sum())
+
+    # a gap can start once the gap before it is done, or right away if >= 2 valid samples separate them (or the
+    # gap before it is not a cubic one, those are final already). a chain of dependent gaps is filled one gap per
+    # round, depth = position in its chain = the round it is filled in
+    gapIndex = np.arange(len(starts))
+    independent = np.concatenate(([True], starts[1:] - ends[:-1] - 1 >= 2))
+    root = independent | ~np.concatenate(([False], cubic[:-1]))
+    depth = gapIndex - np.maximum.accumulate(np.where(root, gapIndex, 0))
+    cubicGaps = gapIndex[cubic]
+    order = cubicGaps[np.argsort(depth[cubicGaps], kind='stable')]
+    roundEnds = np.cumsum(np.bincount(depth[cubicGaps])) if len(cubicGaps) else []
+
+    # anchors for every cubic gap up front, in round order. only the second anchor before a gap can change while
+    # filling: the sample right before a gap is always valid, the one before that is either valid too or the end
+    # of the previous gap, which is filled in the round before or stays NaN
+    s, e = starts[order], ends[order]
+    xa = np.stack([s - 2, s - 1, e + 1, e + 2], axis=1)
+    if anchors == "nearest":
+        # anchors after the gap only see the original data, the nearest 2 valid samples
+        validAfter = np.flatnonzero(~np.isnan(original))
+        q = np.searchsorted(validAfter, e, side='right')
+        fixedOk = q + 1 < len(validAfter)
+        xa[fixedOk, 2] = validAfter[q[fixedOk]]
+        xa[fixedOk, 3] = validAfter[q[fixedOk] + 1]
+        # previous gap left NaN: the nearest valid sample is the one right before that gap
+        fallback = np.where(order > 0, starts[np.maximum(order - 1, 0)] - 1, -1)
+    else:
+        fixedOk = (xa[:, 0] >= 0) & (xa[:, 3] < n)
+        fixedOk[fixedOk] &= ~np.isnan(original[xa[fixedOk, 2:]]).any(axis=1)
+    # placeholders for gaps that are not filled anyway, keeps the gathers below in bounds
+    xa[~fixedOk] = s[~fixedOk, None]
+
+    roundStart = 0
+    for roundEnd in roundEnds:
+        k = slice(roundStart, roundEnd)
+        roundStart = roundEnd
+        x = xa[k]
+        previousNan = np.isnan(out[np.maximum(x[:, 0], 0)])
+        if anchors == "nearest":
+            x[previousNan, 0] = fallback[k][previousNan]
+            ok = fixedOk[k] & (x[:, 0] >= 0)
+        else:
+            ok = fixedOk[k] & ~previousNan
+        if ok.any():
+            xs, ss, sz = x[ok], s[k][ok], sizes[order[k][ok]]
+            # valid anchors after the gap are untouched original samples, so out has them too
+            fillRanges(out, ss, sz, cubicThroughFour(xs, out[xs], ss, sz))
+        filled = int(ok.sum())
+        counts['cubic'] += filled
+        counts['skipped'] += int(roundEnd - k.start) - filled
+
+    counts['skipped'] += int((~linear & ~cubic).sum())
+    return out, counts
@@ -16,7 +16,9 @@ from scripts.others.util import dprint
 
 madMultiplier = 2.5
 
-def madFilter(df):
+# multiplier: how many scaled MADs away from the local median counts as an outlier
+# (madMultiplier above was never wired in, the filter has always used 3)
+def madFilter(df, multiplier=3, window_size=5):
     #we shld actively search for non nan neighbours instead of just using a fixed size window ig
     dprint("Third pass preprocessing: applying median absolute deviation filter")
     #orig_diameters = df['diameter_mm'].values.copy()
@@ -35,7 +37,6 @@ def madFilter(df):
     insufficient_window_cnt = 0
     mad_zero_cnt = 0
     removed_cnt = 0
-    window_size = 5 #might change to 7
     neighbours_cnt = window_size // 2
     
     for i in range(n):
@@ -98,7 +99,7 @@ def madFilter(df):
 
         #scale MAD to estimate SD
         scaled_mad = mad * 1.4826
-        threshold = 3 * scaled_mad
+        threshold = multiplier * scaled_mad
 
         cur_deviation = abs(window_values[0] - window_median)
 
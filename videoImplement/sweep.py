@@ -0,0 +1,141 @@
+# parameter sweep over the preprocessing thresholds
+# every session's raw.csv is loaded ONCE into shared memory, then each grid point runs doProcessing
+# + the PLR metrics on every session in a process pool, instead of hand-editing globals and re-running process.py
+# output: one tidy row per (grid point, session) with bad %, interpolated %, metrics and metric stability
+import os
+import io
+import sys
+import itertools
+import contextlib
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+import align
+import process
+from scripts.others.util import dprint
+
+dataFolder = "data"
+resultsPath = "data/sweepResults.csv"
+
+# values to try for each doProcessing parameter (every combination is one grid point)
+defaultGrid = {
+    'confidenceThreshold': [0.6, 0.7, 0.75, 0.8, 0.9],
+    'madMultiplier': [2.5, 3, 3.5],
+    'madWindow': [5, 7],
+    'maxGapMs': [200, 400],
+    'targetWindowMs': [100, 150, 200],
+}
+
+metricNames = ['baseline_diameter_mm', 'transient_plr_percent', 'constriction_velocity_mm_per_s',
+               'peak_constriction_diameter_mm', 'peak_constriction_percent', 'auc_10_30s_percent_seconds']
+
+
+def gridPoints(grid):
+    keys = list(grid.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def shareSessions(sessionPaths):
+    # one shared memory block per session, raw columns stored as float64 rows
+    blocks, specs = [], []
+    for path in sessionPaths:
+        df = pd.read_csv(os.path.join(path, "raw.csv"))
+        columns = [col for col in df.columns if pd.api.types.is_numeric_dtype(df[col]) or pd.api.types.is_bool_dtype(df[col])]
+        arr = df[columns].to_numpy(dtype=float).T
+        shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+        np.ndarray(arr.shape, dtype=float, buffer=shm.buf)[:] = arr
+        blocks.append(shm)
+        specs.append((os.path.basename(os.path.normpath(path)), shm.name, arr.shape, columns))
+    return blocks, specs
+
+
+# filled in each worker by _attach
+_sessions = {}
+
+
+def _attach(specs):
+    for session, name, shape, columns in specs:
+        shm = shared_memory.SharedMemory(name=name)
+        _sessions[session] = (shm, np.ndarray(shape, dtype=float, buffer=shm.buf), columns)
+
+
+def sessionFrame(session):
+    # fresh DataFrame for one run, the passes modify it in place so the shared copy stays untouched
+    shm, arr, columns = _sessions[session]
+    df = pd.DataFrame({col: arr[k].copy() for k, col in enumerate(columns)})
+    for col in ['is_bad_data', 'was_skipped', 'kalman_rejected']:
+        if col in df.columns:
+            df[col] = df[col].astype(bool)
+    if 'frame_id' in df.columns:
+        df['frame_id'] = df['frame_id'].astype(int)
+    return df
+
+
+def plrMetrics(df, fps, startingIndex):
+    # NaN metrics when align finds no dip / TPLR start (-1) or no baseline values (None) with these settings,
+    # anything else going wrong is a real error and is raised
+    baselineDiameter, tplrStart, dipIndex, baselineIndex, plrDF = align.findPoints(df, startingIndex, fps=fps)
+    if dipIndex == -1 or tplrStart == -1 or baselineDiameter is None:
+        return {name: np.nan for name in metricNames}
+    return align.calculateMetrics(baselineDiameter, tplrStart, dipIndex, baselineIndex, plrDF)
+
+
+def evaluate(job):
+    session, params = job
+    df = sessionFrame(session)
+    fps = round(1.0 / np.median(np.diff(df['timestamp'].values)))
+    row = {'session': session, **params}
+
+    # the passes print a line per frame, keep the workers quiet
+    with contextlib.redirect_stdout(io.StringIO()):
+        processed, before, totalPoints, badPoints, badPercentage = process.doProcessing(df, fps, saveBeforeInterpolation=True, savePathBeforeInterpolation=None, **params)
+        row['bad_percent'] = badPercentage
+        nanBefore = before['diameter_mm'].isna().sum()
+        nanAfter = processed['diameter_mm'].isna().sum()
+        row['interpolated_percent'] = 100.0 * (nanBefore - nanAfter) / totalPoints
+        for prefix, startingIndex in (('blue', 0), ('red', int(55 * fps))):
+            metrics = plrMetrics(processed, fps, startingIndex)
+            for name in metricNames:
+                row[f"{prefix}_{name}"] = metrics[name]
+    return row
+
+
+def addStability(results):
+    # how far each metric moves away from that session's median over the whole grid
+    # metric_instability = mean relative deviation over all metrics (0 = same answer at every grid point)
+    metricCols = [col for col in results.columns if col.startswith('blue_') or col.startswith('red_')]
+    medians = results.groupby('session')[metricCols].transform('median')
+    relDev = (results[metricCols] - medians).abs() / medians.abs().replace(0, np.nan)
+    results['metric_instability'] = relDev.mean(axis=1)
+    return results
+
+
+def runSweep(grid=defaultGrid, sessionPaths=None, workers=None, outputPath=resultsPath):
+    if sessionPaths is None:
+        sessionPaths = [os.path.join(dataFolder, d) for d in sorted(os.listdir(dataFolder)) if os.path.exists(os.path.join(dataFolder, d, "raw.csv"))]
+    points = gridPoints(grid)
+    dprint(f"Sweeping {len(points)} grid points over {len(sessionPaths)} sessions")
+
+    blocks, specs = shareSessions(sessionPaths)
+    try:
+        jobs = [(spec[0], params) for params in points for spec in specs]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(specs,)) as pool:
+            rows = list(pool.map(evaluate, jobs, chunksize=max(1, len(jobs) // (8 * (os.cpu_count() or 1)))))
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+    results = addStability(pd.DataFrame(rows))
+    results.to_csv(outputPath, index=False)
+    dprint(f"Sweep results saved to '{outputPath}'")
+
+    summary = results.groupby(list(grid.keys()))[['bad_percent', 'interpolated_percent', 'metric_instability']].mean()
+    print(summary.sort_values('metric_instability').head(10).to_string())
+    return results
+
+
+if __name__ == "__main__":
+    # python sweep.py [session folder ...]
+    runSweep(sessionPaths=sys.argv[1:] or None)
@@ -1,5 +1,31 @@
 from tkinter import *
-#import main
+from tkinter import filedialog
+import os
+import time
+import queue
+import threading
+import cv2
+import numpy as np
+import main
+import liveMetrics
+from scripts.others.graph import decimateMinMax
+
+# detection runs in a background thread, the Tk main loop only ever reads progressQueue
+# so the window keeps redrawing during long 1080p sessions
+progressQueue = queue.Queue()
+cancelEvent = threading.Event()
+worker = None
+pollMs = 100
+
+# what the worker has sent so far
+trace = {'frames': [], 'diameter_mm': []}
+progress = {'done': 0, 'total': 0, 'started': 0.0}
+# PLR metrics on the raw trace, each one shows up as soon as its window has closed
+metrics = None
+metricsText = {}
+
+plotWidth = 580
+plotHeight = 300
 
 # basic window
 root = Tk()
@@ -16,8 +42,167 @@ videoSelectionLabel.place(x = 10, y = 10)
 videoSelectionEntry = Entry(root, width = 45)
 videoSelectionEntry.place(x=100, y = 10)
 
+
+def browse():
+    path = filedialog.askopenfilename(title="Select pupil video", filetypes=[("Videos", "*.mp4 *.avi *.mov *.mkv"), ("All files", "*")])
+    if path:
+        videoSelectionEntry.delete(0, END)
+        videoSelectionEntry.insert(0, path)
+
+
 # button for browsing
-videoSelectionBrowseButton = Button(root, text = "browse")
+videoSelectionBrowseButton = Button(root, text = "browse", command = browse)
 videoSelectionBrowseButton.place(x = 510, y = 10)
 
-root.mainloop()
\ No newline at end of file
+
+# ---- background worker ----
+
+def onProgress(done, total, diameter, confidence):
+    # called from the worker thread for every frame, only hands the numbers over
+    diameterMm = diameter / main.pxToMm if diameter > 0 and confidence >= main.confidenceThresh else float('nan')
+    progressQueue.put(('frame', done, total, diameterMm))
+    return not cancelEvent.is_set()
+
+
+def runPipeline(videoPath):
+    # no cv2 window from a background thread, and decode straight to gray so cancel also stops decoding
+    main.showDetections = False
+    main.useGrayDecode = True
+    try:
+        df, quality, folder, frameRate = main.detectSession(videoPath, onProgress)
+        progressQueue.put(('finished', quality, folder))
+    except Exception as e:
+        progressQueue.put(('error', f"{type(e).__name__}: {e}"))
+
+
+def onMetric(stimulus, name, value):
+    metricsText[f"{stimulus} {name}"] = value
+    metricsLabel.config(text="\n".join(f"{key}: {value:.3f}" for key, value in metricsText.items()))
+
+
+def start():
+    global worker, metrics
+    videoPath = videoSelectionEntry.get().strip()
+    if not os.path.exists(videoPath):
+        statusLabel.config(text=f"status: '{videoPath}' does not exist")
+        return
+    if worker is not None and worker.is_alive():
+        return
+    cancelEvent.clear()
+    trace['frames'].clear()
+    trace['diameter_mm'].clear()
+    progress.update(done=0, total=0, started=time.perf_counter())
+    cap = cv2.VideoCapture(videoPath)
+    progress['fps'] = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.release()
+    metricsText.clear()
+    metricsLabel.config(text="")
+    metrics = liveMetrics.LivePLRMetrics(progress['fps'], onMetric=onMetric)
+    worker = threading.Thread(target=runPipeline, args=(videoPath,), daemon=True)
+    worker.start()
+    startButton.config(state=DISABLED)
+    cancelButton.config(state=NORMAL)
+    statusLabel.config(text="status: running")
+
+
+def cancel():
+    # the worker stops at the next frame and still saves what it has
+    cancelEvent.set()
+    cancelButton.config(state=DISABLED)
+    statusLabel.config(text="status: cancelling...")
+
+
+startButton = Button(root, text = "start", width = 10, command = start)
+startButton.place(x = 10, y = 45)
+cancelButton = Button(root, text = "cancel", width = 10, command = cancel, state = DISABLED)
+cancelButton.place(x = 120, y = 45)
+
+statusLabel = Label(root, text="status: idle", anchor = "w", width = 70)
+statusLabel.place(x = 10, y = 85)
+speedLabel = Label(root, text="", anchor = "w", width = 70)
+speedLabel.place(x = 10, y = 110)
+
+# live trace, plain canvas line (much cheaper than redrawing a matplotlib figure every poll)
+plotCanvas = Canvas(root, width = plotWidth, height = plotHeight, bg = "white")
+plotCanvas.place(x = 10, y = 140)
+traceLine = plotCanvas.create_line(0, 0, 0, 0, fill = "blue")
+plotLabel = plotCanvas.create_text(5, 5, anchor = "nw", text = "diameter (mm)")
+
+metricsLabel = Label(root, text="", anchor = "nw", justify = LEFT, width = 70, height = 8)
+metricsLabel.place(x = 10, y = 450)
+
+
+def redrawTrace():
+    x = np.asarray(trace['frames'], dtype=float)
+    y = np.asarray(trace['diameter_mm'], dtype=float)
+    # one min/max pair per canvas pixel is all the screen can show
+    x, y = decimateMinMax(x, y, plotWidth)
+    keep = ~np.isnan(y)
+    if keep.sum() < 2:
+        return
+    x, y = x[keep], y[keep]
+    total = max(progress['total'], x[-1] + 1)
+    low, high = np.min(y), np.max(y)
+    span = high - low if high > low else 1.0
+    px = x / total * (plotWidth - 10) + 5
+    py = plotHeight - 10 - (y - low) / span * (plotHeight - 30)
+    plotCanvas.coords(traceLine, *np.column_stack([px, py]).ravel())
+    plotCanvas.itemconfig(plotLabel, text=f"diameter (mm)  {low:.2f} - {high:.2f}")
+
+
+def poll():
+    # drain everything the worker sent since the last poll, then redraw once
+    finished = None
+    newFrames = False
+    while True:
+        try:
+            message = progressQueue.get_nowait()
+        except queue.Empty:
+            break
+        if message[0] == 'frame':
+            _, done, total, diameterMm = message
+            progress['done'] = done
+            progress['total'] = total or 0
+            trace['frames'].append(done - 1)
+            trace['diameter_mm'].append(diameterMm)
+            # done - 1 is the frame index, also after a resume where the first message is for frame resumeFrom
+            metrics.push((done - 1) / progress['fps'], diameterMm, done - 1)
+            newFrames = True
+        else:
+            finished = message
+
+    if newFrames:
+        elapsed = time.perf_counter() - progress['started']
+        fps = progress['done'] / elapsed if elapsed > 0 else 0.0
+        if progress['total'] and fps > 0:
+            eta = (progress['total'] - progress['done']) / fps
+            speedLabel.config(text=f"{progress['done']}/{progress['total']} frames  {fps:.1f} frames/s  ETA {eta:.0f}s")
+        else:
+            speedLabel.config(text=f"{progress['done']} frames  {fps:.1f} frames/s")
+        redrawTrace()
+
+    if finished is not None:
+        metrics.finish()
+        if finished[0] == 'finished':
+            _, quality, folder = finished
+            reason = f" ({quality['reason']})" if quality.get('reason') else ""
+            statusLabel.config(text=f"status: {quality['status']}{reason}, saved to '{folder}'")
+        else:
+            statusLabel.config(text=f"status: failed, {finished[1]}")
+        startButton.config(state=NORMAL)
+        cancelButton.config(state=DISABLED)
+
+    root.after(pollMs, poll)
+
+
+def onClose():
+    # let a running detection stop at the next frame instead of killing it mid-write
+    cancelEvent.set()
+    if worker is not None:
+        worker.join(timeout=5)
+    root.destroy()
+
+
+root.protocol("WM_DELETE_WINDOW", onClose)
+root.after(pollMs, poll)
+root.mainloop()